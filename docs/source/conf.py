@@ -37,11 +37,12 @@ html_static_path = ['_static']
 # add these directories to sys.path here.
 import pathlib
 import sys
-pkg_path = pathlib.Path(__file__).parents[2].resolve().as_posix()
-sys.path.insert(0, pkg_path)
-print(f"Package path: {pkg_path}")
+PKG_PATH = pathlib.Path(__file__).resolve().parents[2].as_posix()
+if PKG_PATH not in sys.path:
+    sys.path.insert(0, PKG_PATH)
 
-autodoc_mock_imports = ["pyvisa", "pyrpl"]
+# the documented modules don't need scipy or matplotlib at import time, so there's no need to import them either
+autodoc_mock_imports = ["pyvisa", "pyrpl", "scipy", "matplotlib"]
 
 autodoc_default_options = {
     'members': True,
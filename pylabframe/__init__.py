@@ -1,8 +1,30 @@
 """pyLabFrame is a Python package to help you interact with laboratory instruments and measurement data."""
 
+import importlib
+
 from . import general
 from . import config
 
-# note that this sets up a post config hook, so importing it here makes that robust
-from . import data
-from .data import path
+
+# the data module pulls in numpy and scipy, so it is only imported when it is first accessed (PEP 562)
+_lazy_submodules = {
+    "data": ".data",
+    "path": ".data.path",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_submodules:
+        module = importlib.import_module(_lazy_submodules[name], __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+# this post config hook used to be set up by importing data.path here.
+# registering it directly keeps it robust without importing the data module
+@config._register_internal_post_config_hook
+def _require_today_dir():
+    if config.get('data.require_today_dir'):
+        from .data import path
+        path.require_today_dir()
@@ -32,18 +32,35 @@ r"""Current config file format, in TOML syntax:
         address = "USB::0x1234::222::23423::INSTR"
 """
 
-try:
+import sys
+
+# prefer the stdlib parser on 3.11+, so a stale (pure-python) tomli install can never shadow it
+if sys.version_info >= (3, 11):
     import tomllib
-except ModuleNotFoundError:
+else:
     import tomli as tomllib
 
+# rtoml is an optional, faster (rust-based) parser. it is picked up automatically if installed
+try:
+    import rtoml
+except ImportError:
+    rtoml = None
+
 import os
 import copy
 import pprint
+import functools
+import pathlib
 
 _config_path = None
 _loaded_settings = None
 
+# parsed config files, keyed by path. entries hold (mtime, settings) so that changed files are re-parsed
+_settings_cache = {}
+
+# bumped whenever the settings change, so that other modules can tell whether values they cached are still valid
+_settings_version = 0
+
 
 _default_settings_toml = """
 computer_name = ""
@@ -86,20 +103,44 @@ def use(config_file, run_post_config_hooks=True):
 
 
 
-def reload(file=None, run_post_config_hooks=True):
+def reload(file=None, run_post_config_hooks=True, force=False, clear_hooks=False):
+    """(Re)load the settings from file, or from the current config file if not given.
+
+    The file is only parsed again if it changed on disk, or if force is set. With clear_hooks, all post-config hooks
+    registered through register_post_config_hook are removed before the hooks are run. pylabframe's own hooks (e.g.
+    the one that enforces data.require_today_dir) are kept.
+    """
     if file is None:
         file = _config_path
+    if clear_hooks:
+        for hook_func in [h for h, internal in _post_config_hooks.items() if not internal]:
+            del _post_config_hooks[hook_func]
+
+    file = os.path.abspath(file)
+    mtime = os.stat(file).st_mtime_ns
+    if force or file not in _settings_cache or _settings_cache[file][0] != mtime:
+        _settings_cache[file] = (mtime, _load_toml(file))
 
-    with open(file, "rb") as f:
-        settings_dict = tomllib.load(f)
+    # hand out a copy, such that changes made through set() don't leak into the cache
+    settings_dict = copy.deepcopy(_settings_cache[file][1])
 
-    global _loaded_settings
+    global _loaded_settings, _settings_version
     _loaded_settings = settings_dict
+    _settings_version += 1
 
     if run_post_config_hooks:
         _post_config()
 
 
+def _load_toml(file):
+    # config files are small: read them in one go and parse the string, rather than going through a buffered reader
+    toml_str = pathlib.Path(file).read_bytes().decode("utf-8")
+
+    if rtoml is not None:
+        return rtoml.loads(toml_str)
+    return tomllib.loads(toml_str)
+
+
 def print(default=False):
     if not default:
         pprint.pprint(_loaded_settings)
@@ -107,8 +148,15 @@ def print(default=False):
         pprint.pprint(_default_settings)
 
 
+def _copy_value(val):
+    # scalar settings (strings, numbers, dates) are immutable, so only containers need to be (deep-)copied
+    if isinstance(val, (dict, list)):
+        return copy.deepcopy(val)
+    return val
+
+
 def get(key=None, default=None, do_copy=True):
-    copy_func = copy.deepcopy if do_copy else lambda x: x
+    copy_func = _copy_value if do_copy else lambda x: x
 
     if key == None:
         return copy_func(_loaded_settings)
@@ -124,10 +172,16 @@ def get(key=None, default=None, do_copy=True):
                 raise e
 
 
+@functools.lru_cache(maxsize=None)
+def _split_key(key):
+    # keys are typically string literals that are looked up over and over, so we only split them once
+    return tuple(key.split("."))
+
+
 def _get(key, settings_dict, do_copy=True):
-    copy_func = copy.deepcopy if do_copy else lambda x: x
+    copy_func = _copy_value if do_copy else lambda x: x
 
-    keys = key.split(".")
+    keys = _split_key(key)
 
     leaf = settings_dict
     for k in keys:
@@ -137,7 +191,7 @@ def _get(key, settings_dict, do_copy=True):
 
 
 def exists(key, in_default=False):
-    keys = key.split(".")
+    keys = _split_key(key)
 
     leaf = _loaded_settings if not in_default else _default_settings
 
@@ -153,7 +207,9 @@ def exists(key, in_default=False):
 
 
 def set(key, val):
-    keys = key.split(".")
+    global _settings_version
+    _settings_version += 1
+    keys = _split_key(key)
 
     leaf = _loaded_settings
     parent_leaf = None
@@ -172,22 +228,41 @@ def set(key, val):
 
 
 def list_append(key, val, create_list_if_not_exist=True):
-    if create_list_if_not_exist and not exists(key):
-        set(key, [])
+    global _settings_version
+    _settings_version += 1
+    keys = _split_key(key)
+
+    leaf = _loaded_settings
+    for k in keys[:-1]:
+        leaf = leaf.setdefault(k, {})
 
-    _get(key, _loaded_settings, do_copy=False).append(module)
+    if create_list_if_not_exist:
+        leaf.setdefault(keys[-1], [])
+    leaf[keys[-1]].append(val)
 
 
 # code to run after a configuration file has been specified
 # used to set up the environment
-_post_config_hooks = []
+# we use a dict as an ordered set, such that registering a hook twice doesn't make it run twice
+# ordered set of hooks, the value marks pylabframe's own hooks, which survive reload(clear_hooks=True)
+_post_config_hooks = {}
 
 
 def register_post_config_hook(func):
-    _post_config_hooks.append(func)
+    _post_config_hooks[func] = False
     return func
 
 
+def _register_internal_post_config_hook(func):
+    _post_config_hooks[func] = True
+    return func
+
+
+def unregister_post_config_hook(func):
+    _post_config_hooks.pop(func, None)
+
+
 def _post_config():
-    for hook_func in _post_config_hooks:
+    # iterate over a copy, hooks might (un)register other hooks
+    for hook_func in list(_post_config_hooks):
         hook_func()
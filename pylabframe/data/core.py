@@ -1,11 +1,16 @@
 import numpy as np
-import scipy.optimize
 import copy
+import os
+import json
 from enum import Enum
 
 from .. import util
 from . import path
 
+# attributes that NumericalData passes through to its data_array
+_NDARRAY_ATTRS = frozenset(dir(np.ndarray))
+
+
 class NumericalData:
     """
     Holds numerical data in data_array. The first axis is understood to be the x-axis, the y-axis is the second axis and so forth.
@@ -16,7 +21,28 @@ class NumericalData:
             self.parent: "NumericalData" = parent
 
         def __getitem__(self, item):
-            sub_array = self.parent.data_array.__getitem__(item)
+            # bind the parent's attributes to locals once, they're used repeatedly below
+            parent = self.parent
+            parent_axes = parent.axes
+            parent_axes_names = parent.axes_names
+            ndim = parent.data_array.ndim
+            n_axes = len(parent_axes)
+            n_axes_names = len(parent_axes_names)
+
+            sub_array = parent.data_array.__getitem__(item)
+
+            # fast paths for the most common case: a single index or slice on 1D data
+            if ndim == 1 and type(item) in (int, slice):
+                ax = parent_axes[0] if n_axes > 0 else None
+                ax_name = parent_axes_names[0] if n_axes_names > 0 else None
+                new_ax_or_val = ax[item] if ax is not None else None
+
+                if type(item) is int:
+                    reduced_axes = parent.reduced_axes + [{"axis_name": ax_name, "axis": 0, "index": item, "value": new_ax_or_val}]
+                    return NumericalData(data_array=sub_array, axes=[], axes_names=[], reduced_axes=reduced_axes, metadata=parent.metadata.copy())
+                else:
+                    sub_axes_names = [ax_name] if n_axes_names > 0 else []
+                    return NumericalData(data_array=sub_array, axes=[new_ax_or_val], axes_names=sub_axes_names, reduced_axes=parent.reduced_axes, metadata=parent.metadata.copy())
 
             # calculate the new axes
             # start by regularizing the list of the requested slices/indices
@@ -25,49 +51,55 @@ class NumericalData:
             else:
                 slice_list = [item]
 
-            if len(slice_list) < self.parent.data_array.ndim and Ellipsis not in slice_list:
+            if len(slice_list) < ndim and Ellipsis not in slice_list:
                 slice_list += [Ellipsis]
 
             # we need to do identity checking instead of equality checking here (as list.count does) to handle index arrays
-            num_ellipses = len([s for s in slice_list if s is Ellipsis])
+            num_ellipses = sum(1 for s in slice_list if s is Ellipsis)
             if num_ellipses > 1:
                 raise ValueError(f"Multiple ellipses specified in {item} (expanded to {slice_list})")
             # expand the ellipses
             elif num_ellipses == 1:
                 e_idx = slice_list.index(Ellipsis)
-                n_expanded_slices = self.parent.data_array.ndim - (len(slice_list) - 1)
+                n_expanded_slices = ndim - (len(slice_list) - 1)
                 slice_list = slice_list[:e_idx] + [slice(None)]*(n_expanded_slices) + slice_list[e_idx+1:]
 
-            if len(slice_list) != self.parent.data_array.ndim:
-                raise ValueError(f"Incorrect number of indices in {item} (expanded to {slice_list}), expected {self.parent.data_array.ndim}")
+            if len(slice_list) != ndim:
+                raise ValueError(f"Incorrect number of indices in {item} (expanded to {slice_list}), expected {ndim}")
 
-            reduced_axes = self.parent.reduced_axes
+            new_reduced_axes = []
             sub_axes = []
             sub_axes_names = []
-            parent_red_ax_pos = np.array([a["axis"] for a in reduced_axes])
 
             # the ordering of array indexing is the same as the order of the axis list
-            slice_list = slice_list
-
-            for i in range(len(slice_list)):
-                if i < len(self.parent.axes) and self.parent.axes[i] is not None:
-                    new_ax_or_val = self.parent.axes[i][slice_list[i]]
+            for i, cur_slice in enumerate(slice_list):
+                if i < n_axes and parent_axes[i] is not None:
+                    new_ax_or_val = parent_axes[i][cur_slice]
                 else:
                     new_ax_or_val = None
 
-                if np.isscalar(slice_list[i]):
-                    if i < len(self.parent.axes_names):
-                        cur_ax_name = self.parent.axes_names[i]
+                # plain ints are by far the most common scalar index, check for those before the slower np.isscalar
+                if type(cur_slice) is int or np.isscalar(cur_slice):
+                    if i < n_axes_names:
+                        cur_ax_name = parent_axes_names[i]
                     else:
                         cur_ax_name = None
                     cur_ax_pos = i  # TODO: fix this to reflect the axes that have already been taken out in the parent
-                    reduced_axes.append({"axis_name": cur_ax_name, "axis": cur_ax_pos, "index": slice_list[i], "value": new_ax_or_val})
+                    new_reduced_axes.append({"axis_name": cur_ax_name, "axis": cur_ax_pos, "index": cur_slice, "value": new_ax_or_val})
                 else:
                     sub_axes.append(new_ax_or_val)
-                    if i < len(self.parent.axes_names):
-                        sub_axes_names.append(self.parent.axes_names[i])
+                    if i < n_axes_names:
+                        sub_axes_names.append(parent_axes_names[i])
+
+            # reduced_axes lists are never modified in place, so it's safe to share the parent's if no axes were reduced
+            # (this used to append to the parent's list directly). the metadata does need its own (shallow) copy,
+            # so that changing an item on the sub-object doesn't affect the parent
+            if new_reduced_axes:
+                reduced_axes = parent.reduced_axes + new_reduced_axes
+            else:
+                reduced_axes = parent.reduced_axes
 
-            sub_data = NumericalData(data_array=sub_array, axes=sub_axes, axes_names=sub_axes_names, reduced_axes=reduced_axes, metadata=self.parent.metadata.copy())
+            sub_data = NumericalData(data_array=sub_array, axes=sub_axes, axes_names=sub_axes_names, reduced_axes=reduced_axes, metadata=parent.metadata.copy())
 
             return sub_data
 
@@ -171,6 +203,17 @@ class NumericalData:
                 if error_array.shape != data_array.shape:
                     raise ValueError(f"Data array and error array have incompatible shapes {self.data_array.shape} != {self.error_array.shape}")
 
+    @property
+    def data_array(self):
+        return self._data_array
+    @data_array.setter
+    def data_array(self, new_data_array):
+        self._data_array = new_data_array
+        # smoothed copies of data_array, filled in by the peak guessing in fitters (see fitters._cached_savgol_filter).
+        # in-place operators like data.data_array *= 2 go through here as well, but writing to individual elements
+        # doesn't: reassign data_array afterwards (data.data_array = data.data_array) to drop the stale copies
+        self._smoothing_cache = {}
+
     def set_axis(self, ax_index, ax_values, convert_to_numpy=True):
         if len(self.axes) < ax_index + 1:
             self.axes = self.axes + [None] * (ax_index + 1 - len(self.axes))
@@ -223,9 +266,31 @@ class NumericalData:
     def data_range(self):
         return (np.min(self.data_array), np.max(self.data_array))
 
+    # the most used data_array attributes are defined explicitly, so they don't have to go through __getattr__
+    @property
+    def ndim(self):
+        return self.data_array.ndim
+
+    @property
+    def shape(self):
+        return self.data_array.shape
+
+    @property
+    def dtype(self):
+        return self.data_array.dtype
+
+    @property
+    def size(self):
+        return self.data_array.size
+
     # patch all calls that don't work on the NumericalData object directly through to the underlying data_array
     def __getattr__(self, item):
-        if hasattr(self.data_array, item):
+        # checking against a fixed set is much cheaper than hasattr, which matters because e.g. matplotlib and
+        # IPython probe a lot of attributes that don't exist
+        if item in _NDARRAY_ATTRS:
+            return getattr(self.data_array, item)
+        # data_array isn't necessarily a numpy array if it was constructed with convert_to_numpy=False
+        elif item not in ("data_array", "_data_array") and not isinstance(self.data_array, np.ndarray) and hasattr(self.data_array, item):
             return getattr(self.data_array, item)
         else:
             raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{item}' and neither does the underlying data_array")
@@ -251,40 +316,43 @@ class NumericalData:
         :param convert_ax_to_numpy:
         :return:
         """
-        data_arrays = []
-        individual_metadata = {}
-        new_metadata = None
         if new_axis is not None and new_axis_metadata_key is not None:
             raise ValueError("new_axis and new_axis_metadata_key can not be set at the same time")
 
-        if new_axis_metadata_key is not None:
-            new_axis = []
-
         if sort_by_metadata_key and new_axis_metadata_key is not None:
             if sort_by_metadata_key is True:
                 sort_by_metadata_key = new_axis_metadata_key
             data_objs = sorted(data_objs, key=lambda o: o.metadata[sort_by_metadata_key])
 
-        for o in data_objs:
-            if isinstance(o, NumericalData):
-                data_arrays.append(o.data_array)
-                if new_metadata is None:
-                    new_metadata = o.metadata.copy()
-                if retain_individual_metadata:
-                    individual_metadata[len(data_arrays) - 1] = o.metadata
-                if new_axis_metadata_key is not None:
-                    new_axis.append(o.metadata[new_axis_metadata_key])
-            else:
-                data_arrays.append(o)
+        data_arrays = [o.data_array if isinstance(o, NumericalData) else o for o in data_objs]
 
-        if new_metadata is None:
-            new_metadata = {}
+        # the metadata of the first data object is taken over by the stacked object
+        first_data_obj = next((o for o in data_objs if isinstance(o, NumericalData)), None)
+        new_metadata = first_data_obj.metadata.copy() if first_data_obj is not None else {}
+
+        if new_axis_metadata_key is not None:
+            new_axis = [o.metadata[new_axis_metadata_key] for o in data_objs if isinstance(o, NumericalData)]
 
         if retain_individual_metadata:
-            new_metadata["_individual_metadata"] = individual_metadata
+            new_metadata["_individual_metadata"] = {i: o.metadata for i, o in enumerate(data_objs) if isinstance(o, NumericalData)}
 
         # stack new data array
-        new_data_array = np.stack(data_arrays, axis=axis)
+        # we fill a preallocated array rather than calling np.stack, which saves a pass over the list of arrays
+        data_arrays = [np.asarray(a) for a in data_arrays]
+        item_shape = data_arrays[0].shape
+        if any(a.shape != item_shape for a in data_arrays):
+            raise ValueError("All data arrays must have the same shape to be stacked")
+        stack_axis = axis if axis >= 0 else len(item_shape) + 1 + axis
+        if not 0 <= stack_axis <= len(item_shape):
+            raise ValueError(f"Stacking axis {axis} is out of bounds for {len(item_shape) + 1}-dimensional stacked data")
+
+        # only pass the unique dtypes, np.result_type has a limit on the number of arguments
+        new_dtype = np.result_type(*{a.dtype for a in data_arrays})
+        new_data_array = np.empty(item_shape[:stack_axis] + (len(data_arrays),) + item_shape[stack_axis:], dtype=new_dtype)
+        stack_index = [slice(None)] * new_data_array.ndim
+        for i, a in enumerate(data_arrays):
+            stack_index[stack_axis] = i
+            new_data_array[tuple(stack_index)] = a
 
         # insert new axis
         if convert_ax_to_numpy and new_axis is not None:
@@ -372,41 +440,72 @@ class NumericalData:
     # saving functions
     # ================
     def save_npz(self, file, stringify_enums=True, save_timestamp=True, save_location_option=None, **expand_kw):
-        file = path.expand_default_save_location(file, save_location_option=save_location_option, **expand_kw)
+        # the existence check is left to the OS when the file is created, rather than stat-ing the file beforehand
+        exist_ok = expand_kw.pop("exist_ok", False)
+        file = path.expand_default_save_location(file, save_location_option=save_location_option, exist_ok=True, **expand_kw)
         num_axes = len(self.axes) if self.axes is not None else 0
-        if num_axes > 0:
-            ax_dict = {f"axis_{i}": self.axes[i] for i in range(num_axes)}
-        else:
-            ax_dict = {}
+        # axes that are None are not saved, so they don't need to be pickled. load_npz fills them back in
+        ax_dict = {f"axis_{i}": self.axes[i] for i in range(num_axes) if self.axes[i] is not None}
 
         if save_timestamp:
             self.metadata["save_date"] = path.current_datestamp()
             self.metadata["save_time"] = path.current_timestamp()
 
-        metadata = copy.deepcopy(self.metadata)
+        # no need to copy the metadata: it is only serialized, and map_nested_dict builds new dicts anyway
+        metadata = self.metadata
         if stringify_enums:
             metadata = util.map_nested_dict(
                 lambda x: f"{x.__class__.__name__}.{x.name}" if isinstance(x, Enum) else x,
                 metadata
             )
 
-        np.savez(file,
-                 data_array=self.data_array, num_axes=num_axes, **ax_dict,
-                 axes_data={'axes_names': self.axes_names, 'reduced_axes': self.reduced_axes},
-                 metadata=metadata
-                 )
+        axes_data = {'axes_names': self.axes_names, 'reduced_axes': self.reduced_axes}
+
+        info_dict = None
+        # object arrays are pickled by np.savez. load_npz only allows unpickling for files without JSON metadata, so
+        # files with object arrays are saved in that (pickled) format altogether
+        if not any(np.asarray(a).dtype.hasobject for a in [self.data_array, *ax_dict.values()]):
+            try:
+                # store the metadata as JSON-encoded bytes, so loading the file doesn't require unpickling
+                info_dict = {
+                    "axes_data_json": _to_json_bytes(axes_data),
+                    "metadata_json": _to_json_bytes(metadata),
+                }
+            except TypeError:
+                pass
+        if info_dict is None:
+            # fall back to pickled python objects for metadata that can't be expressed in JSON (exactly)
+            info_dict = {
+                "axes_data": axes_data,
+                "metadata": metadata,
+            }
+
+        with _open_npz_for_writing(file, exist_ok) as f:
+            np.savez(f,
+                     data_array=self.data_array, num_axes=num_axes, **ax_dict,
+                     **info_dict
+                     )
 
         return file
 
     @classmethod
     def load_npz(cls, file):
-        npz_data = np.load(file, allow_pickle=True)
-        data_array = npz_data['data_array']
-        num_axes = npz_data['num_axes'].item()  # scalar values are saved as a 0-dimensional array, need to extract
-        axes_data = npz_data['axes_data'].item()
-        metadata = npz_data['metadata'].item()
+        # the archive is closed again once everything is read, rather than leaving that to garbage collection
+        with np.load(file) as npz_data:
+            if "metadata_json" in npz_data.files:
+                axes_data = _from_json_bytes(npz_data['axes_data_json'])
+                metadata = _from_json_bytes(npz_data['metadata_json'])
+            else:
+                # legacy files (or files with non-JSON metadata or object arrays) store pickled python objects. allow
+                # those on the archive we already have open, rather than opening the file a second time
+                npz_data.allow_pickle = True
+                axes_data = npz_data['axes_data'].item()
+                metadata = npz_data['metadata'].item()
 
-        axes = [npz_data[f'axis_{i}'] for i in range(num_axes)]
+            data_array = npz_data['data_array']
+            num_axes = npz_data['num_axes'].item()  # scalar values are saved as a 0-dimensional array, need to extract
+
+            axes = [npz_data[f'axis_{i}'] if f'axis_{i}' in npz_data.files else None for i in range(num_axes)]
 
         return cls(data_array, axes=axes, axes_names=axes_data['axes_names'], reduced_axes=axes_data['reduced_axes'], metadata=metadata)
 
@@ -431,8 +530,8 @@ class NumericalData:
             import matplotlib.pyplot as plt
             plot_axis = plt.gca()
 
-        plot_y = y_scaling * (apply_data_func(self.data_array) - y_offset)
-        plot_x = x_scaling * (self.x_axis - x_offset)
+        plot_y = _affine_transform(apply_data_func(self.data_array), y_scaling, y_offset)
+        plot_x = _affine_transform(self.x_axis, x_scaling, x_offset)
 
         if self.error_array is not None:
             plot_err = y_scaling * error_scaling * apply_data_func(self.error_array)  # depending on the data func applied, this might not make sense
@@ -488,14 +587,17 @@ class NumericalData:
             import matplotlib.pyplot as plt
             plot_axis = plt.gca()
 
-        plot_x = x_scaling * (self.x_axis - x_offset)
-        plot_y = y_scaling * (self.y_axis - y_offset)
-        plot_z = z_scaling * (apply_data_func(self.data_array) - z_offset)
-        plot_z = plot_z.T
+        plot_x = _affine_transform(self.x_axis, x_scaling, x_offset)
+        plot_y = _affine_transform(self.y_axis, y_scaling, y_offset)
+        # pcolormesh expects the x axis along the columns, so transpose the view (only if needed) before any
+        # arithmetic. writing the affine transform to a C-ordered result saves pcolormesh from copying it again
+        plot_z = apply_data_func(self.data_array)
+        if not transpose:
+            plot_z = plot_z.T
+        plot_z = _affine_transform(plot_z, z_scaling, z_offset, order='C')
 
         if transpose:
             plot_x, plot_y = plot_y, plot_x
-            plot_z = plot_z.T
 
             x_label, y_label = y_label, x_label
 
@@ -577,6 +679,8 @@ class NumericalData:
             grid = np.meshgrid(*self.axes[::-1])
             xdata = np.stack(grid, axis=-1).reshape(-1, len(self.axes))[:,::-1]
 
+        # scipy is only needed for fitting, so we don't import it at module load
+        import scipy.optimize
         popt, pcov, infodict, mesg, ier = scipy.optimize.curve_fit(
             fit_func_wrapper, xdata, ydata, p0=p0, full_output=True, **kw
         )
@@ -701,7 +805,9 @@ f"""Fit result summary for {self.fit_def.get_name()}
     # saving functions
     # ================
     def save_npz(self, file, save_timestamp=True, save_location_option=None, **expand_kw):
-        file = path.expand_default_save_location(file, save_location_option=save_location_option, **expand_kw)
+        # the existence check is left to the OS when the file is created, rather than stat-ing the file beforehand
+        exist_ok = expand_kw.pop("exist_ok", False)
+        file = path.expand_default_save_location(file, save_location_option=save_location_option, exist_ok=True, **expand_kw)
 
         data_to_save = {
             "fit_def": self.fit_def.__name__,
@@ -720,7 +826,8 @@ f"""Fit result summary for {self.fit_def.get_name()}
             data_to_save["save_date"] = path.current_datestamp()
             data_to_save["save_time"] = path.current_timestamp()
 
-        np.savez(file, **data_to_save)
+        with _open_npz_for_writing(file, exist_ok) as f:
+            np.savez(f, **data_to_save)
 
 
 class FitterDefinition:
@@ -743,9 +850,75 @@ class FitterDefinition:
             return cls.__name__
 
 
+# saving utility functions
+# ========================
+
+def _json_default(obj):
+    # numpy scalars are common in metadata (e.g. the values of reduced axes), store them as python values
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+def _survives_json(obj, loaded):
+    # JSON silently turns tuples into lists and non-string dict keys into strings. such values would come back changed,
+    # so we check that the decoded value is exactly what we started with
+    if isinstance(obj, dict):
+        return (type(loaded) is dict and list(obj.keys()) == list(loaded.keys())
+                and all(_survives_json(v, loaded[k]) for k, v in obj.items()))
+    elif isinstance(obj, list):
+        return (type(loaded) is list and len(obj) == len(loaded)
+                and all(_survives_json(v, lv) for v, lv in zip(obj, loaded)))
+    elif isinstance(obj, (tuple, set, np.ndarray)) or isinstance(loaded, (dict, list)):
+        return False
+    # NaN is the one value that isn't equal to itself
+    return obj == loaded or (obj != obj and loaded != loaded)
+
+
+def _to_json_bytes(obj):
+    """Encode ``obj`` as JSON bytes. Raises :exc:`TypeError` if it can't be stored as JSON without changing it."""
+    json_str = json.dumps(obj, default=_json_default)
+    if not _survives_json(obj, json.loads(json_str)):
+        raise TypeError("Object changes when stored as JSON")
+    return np.frombuffer(json_str.encode('utf-8'), dtype=np.uint8)
+
+
+def _from_json_bytes(arr):
+    return json.loads(arr.tobytes().decode('utf-8'))
+
+
 # plotting utility functions
 # ==========================
 
+def _open_npz_for_writing(file, exist_ok=False):
+    # np.savez adds the extension if it's missing, do the same so we create the file it would have written.
+    # opening in 'x' mode makes the OS raise FileExistsError, saving a separate existence check
+    file = os.fspath(file)
+    if not file.endswith(".npz"):
+        file += ".npz"
+    return open(file, "wb" if exist_ok else "xb")
+
+
+def _affine_transform(arr, scaling, offset, order='K'):
+    """Compute ``scaling * (arr - offset)`` using a single output array, or none at all if it's the identity."""
+    arr = np.asarray(arr)
+    if scaling == 1. and offset == 0.:
+        return arr if order == 'K' else np.asarray(arr, order=order)
+
+    out = np.subtract(arr, offset, dtype=np.result_type(arr, offset, scaling), order=order)
+    out *= scaling
+    return out
+
+
+def _mesh_corners(center_locs):
+    # fill a preallocated array directly, rather than concatenating the midpoints and end corners
+    corners = np.empty(center_locs.size + 1, dtype=np.result_type(center_locs, 0.5))
+    corners[1:-1] = 0.5 * (center_locs[:-1] + center_locs[1:])
+    corners[0] = 1.5 * center_locs[0] - 0.5 * center_locs[1]
+    corners[-1] = 1.5 * center_locs[-1] - 0.5 * center_locs[-2]
+    return corners
+
+
 def plot_2d_data(x, y, z, ax=None, fix_mesh=True, rasterized=True, **kw):
     plotdata = [x, y, z]
 
@@ -755,18 +928,7 @@ def plot_2d_data(x, y, z, ax=None, fix_mesh=True, rasterized=True, **kw):
         # however, our dataArray specified the values at the center values given by X & Y
         # so we need to convert this into corners locations: take the midpoints of the axis points and add
         # corners to the beginning and end of the axis
-        plotdata_fixed = []
-        for i in range(2):
-            center_locs = plotdata[i]
-            midpoints = (center_locs[:-1] + center_locs[1:]) / 2
-            left_corner = 1.5 * center_locs[0] - 0.5 * center_locs[1]
-            right_corner = 1.5 * center_locs[-1] - 0.5 * center_locs[-2]
-
-            corners = np.concatenate(([left_corner], midpoints, [right_corner]))
-            plotdata_fixed.append(corners)
-
-        plotdata_fixed.append(plotdata[-1])
-        plotdata = plotdata_fixed
+        plotdata = [_mesh_corners(np.asarray(x)), _mesh_corners(np.asarray(y)), z]
 
     im = ax.pcolormesh(*plotdata, rasterized=rasterized, **kw)
 
@@ -1,9 +1,20 @@
+import collections
+import functools
 import numpy as np
 import scipy
+import scipy.optimize
+import scipy.signal
+import scipy.sparse
 import scipy.special
 from .core import NumericalData, FitterDefinition, FitResult
 from . import helpers
 
+# numba is optional: if it's available, some fit functions are compiled to speed up the fitting loop
+try:
+    import numba
+except ImportError:
+    numba = None
+
 
 
 def fit_def(fit_func, name, guess_func=None, param_names=None):
@@ -31,6 +42,19 @@ def fit_def(fit_func, name, guess_func=None, param_names=None):
 # helper functions
 # ================
 
+def _linear_regression(x, y):
+    """Closed-form least-squares fit of a straight line, returns (slope, intercept) like np.polyfit(x, y, 1)"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+
+    x_mean = x.mean()
+    y_mean = y.mean()
+    dx = x - x_mean
+    slope = np.dot(dx, y - y_mean) / np.dot(dx, dx)
+
+    return slope, y_mean - slope * x_mean
+
+
 def estimate_offset(ydata, n_bins=10, n_avg_lowest=1):
     """Quasi-sophisticated method to estimate the offset on a Trace
 
@@ -43,14 +67,60 @@ def estimate_offset(ydata, n_bins=10, n_avg_lowest=1):
     the minimum value
     """
 
+    ydata = np.asarray(ydata)
+    n_lowest = min(n_avg_lowest, n_bins)
+
+    if len(ydata) % n_bins == 0:
+        # all bins have equal size, so we can average them all in one go
+        avgs = ydata.reshape(n_bins, -1).mean(axis=1)
+        # we only need the lowest averages, a partial sort is enough
+        return np.mean(np.partition(avgs, n_lowest - 1)[:n_lowest])
+
     bins = np.array_split(ydata, n_bins)
-    avgs = sorted(np.mean(bin_) for bin_ in bins)
+    avgs = np.fromiter((bin_.mean() for bin_ in bins), dtype=np.result_type(ydata, float), count=n_bins)
+
+    return np.mean(np.partition(avgs, n_lowest - 1)[:n_lowest])
+
 
-    return np.mean(avgs[:n_avg_lowest])
+@functools.lru_cache(maxsize=32)
+def _savgol_kernels(window_length, polyorder):
+    """Savitzky-Golay convolution coefficients, plus the matrices that reproduce savgol_filter's 'interp' edge handling"""
+    coeffs = scipy.signal.savgol_coeffs(window_length, polyorder)
+
+    # in 'interp' mode, the edges are replaced by a polynomial fitted to the first/last window_length points.
+    # the fitted values depend linearly on the data, so the edge fits reduce to fixed matrices
+    halflen = window_length // 2
+    t = np.arange(window_length)
+    fit_matrix = np.linalg.pinv(np.vander(t, polyorder + 1))
+    left_edge = np.vander(t[:halflen], polyorder + 1) @ fit_matrix
+    right_edge = np.vander(t[window_length - halflen:], polyorder + 1) @ fit_matrix
+
+    return coeffs, left_edge, right_edge
+
+
+def _first_index_below(signal, level):
+    """Index of the first element of ``signal`` that is below ``level``, or 0 if there is none (like np.argmax does)"""
+    # the running minimum is monotonic, so we can find where it crosses the level by bisection
+    running_min = np.minimum.accumulate(signal)
+    idx = np.searchsorted(-running_min, -level, side='right')
+    return idx if idx < len(signal) else 0
 
 
 def complex_savgol_filter(x, *args, **kw):
-    if np.iscomplexobj(x):
+    x = np.asarray(x)
+    if len(args) == 2 and len(kw) == 0 and x.ndim == 1 and args[0] % 2 == 1 and args[0] <= len(x):
+        # common case: default savgol_filter settings on a 1D trace. use cached coefficients, the real-valued kernel
+        # can be applied to complex data directly
+        window_length, polyorder = args
+        coeffs, left_edge, right_edge = _savgol_kernels(window_length, polyorder)
+        halflen = window_length // 2
+
+        smoothed = np.convolve(x, coeffs, mode='same')
+        if halflen > 0:
+            smoothed[:halflen] = left_edge @ x[:window_length]
+            smoothed[-halflen:] = right_edge @ x[-window_length:]
+        return smoothed
+    elif x.dtype.kind == 'c':
         smooth_real = scipy.signal.savgol_filter(x.real, *args, **kw)
         smooth_imag = scipy.signal.savgol_filter(x.imag, *args, **kw)
         return smooth_real + 1j*smooth_imag
@@ -58,6 +128,148 @@ def complex_savgol_filter(x, *args, **kw):
         return scipy.signal.savgol_filter(x, *args, **kw)
 
 
+def _identity(x):
+    return x
+
+
+def _cached_savgol_filter(data: NumericalData, window_length, polyorder):
+    """complex_savgol_filter on data.data_array, cached on the data object"""
+    # the cache is emptied whenever data_array is (re)assigned, see NumericalData.data_array
+    cache = data._smoothing_cache
+    key = (window_length, polyorder)
+    smoothed = cache.get(key)
+    if smoothed is None:
+        smoothed = complex_savgol_filter(data.data_array, window_length, polyorder)
+        smoothed.flags.writeable = False
+        cache[key] = smoothed
+    return smoothed
+
+
+class StreamingSavgol:
+    """Savitzky-Golay filter for data that comes in bit by bit, e.g. while a trace is being acquired.
+
+    Only the last ``window`` samples are kept. Every new sample gives the smoothed value at the center of that window,
+    so the output lags the input by ``window // 2`` samples. Until the window has filled up, nan is returned.
+    """
+    def __init__(self, window, order):
+        self.window = window
+        self.order = order
+        self._coeffs = _savgol_kernels(window, order)[0]
+        # the kernel is in convolution order, reverse it so it can be dotted with the buffer (oldest sample first)
+        self._dot_coeffs = self._coeffs[::-1]
+        self.buffer = collections.deque(maxlen=window)
+
+    def reset(self):
+        self.buffer.clear()
+
+    def process_one(self, sample):
+        self.buffer.append(sample)
+        if len(self.buffer) < self.window:
+            return np.nan
+        return np.dot(self._dot_coeffs, self.buffer)
+
+    def process(self, samples):
+        """Process a block of samples at once, gives the same output as calling process_one for every sample"""
+        samples = np.asarray(samples)
+        dtype = np.result_type(samples, float)
+        combined = np.concatenate([np.array(self.buffer, dtype=dtype), samples])
+        self.buffer.extend(samples)
+
+        out = np.full(len(samples), np.nan, dtype=dtype)
+        # if the buffer was already full, the first output of the convolution was already given out last time
+        n_out = min(len(combined) - self.window + 1, len(samples))
+        if n_out > 0:
+            if n_out * self.window > 10_000:
+                smoothed = scipy.signal.fftconvolve(combined, self._coeffs, mode='valid')
+            else:
+                smoothed = np.convolve(combined, self._coeffs, mode='valid')
+            out[len(samples) - n_out:] = smoothed[len(smoothed) - n_out:]
+        return out
+
+
+@functools.lru_cache(maxsize=None)
+def _peak_fraction_distance(fitter, fraction):
+    """Distance from the center at which the fitter's (default) single peak drops to a fraction of its maximum.
+
+    This only depends on the peak shape, so it's solved numerically once per fitter class and fraction."""
+    single_peak_y0 = fitter.single_peak_func(0.0)
+    return scipy.optimize.minimize_scalar(lambda s: (fitter.single_peak_func(s) / single_peak_y0 - fraction) ** 2,
+                                          bounds=(0, 1e3), method='bounded').x
+
+
+# ===================
+# in-place evaluation
+# ===================
+# these evaluate the peak functions with a single output buffer, rather than a temporary array per operation.
+# the buffer has the broadcast shape of all arguments, parameters can be arrays as well (e.g. in fit_batch)
+
+def _inplace_buffer(x, *params):
+    return np.empty(np.broadcast(x, *params).shape, dtype=np.result_type(x, *params, 1.))
+
+
+def _lorentzian_inplace(x, area, linewidth, center, offset):
+    buf = _inplace_buffer(x, area, linewidth, center, offset)
+    np.subtract(x, center, out=buf)
+    buf *= buf
+    buf *= 4
+    buf += linewidth * linewidth
+    np.divide((2 / np.pi) * area * linewidth, buf, out=buf)
+    buf += offset
+    return buf
+
+
+def _gaussian_inplace(x, amplitude, sigma, center, offset):
+    buf = _inplace_buffer(x, amplitude, sigma, center, offset)
+    np.subtract(x, center, out=buf)
+    buf *= buf
+    buf *= -0.5 / sigma ** 2
+    np.exp(buf, out=buf)
+    buf *= amplitude
+    buf += offset
+    return buf
+
+
+# ===================
+# compiled kernels
+# ===================
+
+def _lorentzian_kernel(x, area, linewidth, center, offset):
+    out = np.empty_like(x)
+    prefactor = (2 / np.pi) * area * linewidth
+    linewidth_sq = linewidth * linewidth
+    for i in range(x.size):
+        dx = x[i] - center
+        out[i] = offset + prefactor / (4 * dx * dx + linewidth_sq)
+    return out
+
+
+def _halfmax_indices_kernel(signal, idx_max, level):
+    # scan outwards from the peak and stop at the first point below the level on either side.
+    # like _first_index_below, a side without such a point gives back idx_max
+    l_idx = idx_max
+    for i in range(idx_max, -1, -1):
+        if signal[i] < level:
+            l_idx = i
+            break
+
+    r_idx = idx_max
+    for i in range(idx_max, signal.size):
+        if signal[i] < level:
+            r_idx = i
+            break
+
+    return l_idx, r_idx
+
+
+if numba is not None:
+    _lorentzian_kernel = numba.njit(cache=True, fastmath=True)(_lorentzian_kernel)
+    _halfmax_indices_kernel = numba.njit(cache=True)(_halfmax_indices_kernel)
+else:
+    # the pure-python loops would be much slower than plain numpy, so don't use them
+    _lorentzian_kernel = None
+    _halfmax_indices_kernel = None
+
+
 # ===================
 # common fit function
 # ===================
@@ -68,9 +280,9 @@ class PeakedFunction(FitterDefinition):
     @classmethod
     def guess_func(cls, data: NumericalData = None, x=None, y=None, offset=None, smoothing_window=1,
                           smoothing_order=0, closely_spaced=False,
-                          halfmax_thrs=0.5, binned_offset_estimation=False, smooth_postprocess=lambda x: x,
+                          halfmax_thrs=0.5, binned_offset_estimation=False, smooth_postprocess=_identity,
                           take_abs=False,
-                          smooth_preprocess=lambda x: x, pfix_dict=None):
+                          smooth_preprocess=_identity, pfix_dict=None):
         # patch on through
         return cls.guess_single_peak(data=data, x=x, y=y, offset=offset, smoothing_window=smoothing_window,
                               smoothing_order=smoothing_order, closely_spaced=False, halfmax_thrs=0.5, binned_offset_estimation=False,
@@ -79,8 +291,8 @@ class PeakedFunction(FitterDefinition):
 
     @classmethod
     def guess_single_peak(cls, data: NumericalData=None, x=None, y=None, offset=None, smoothing_window=1, smoothing_order=0, closely_spaced=False,
-                  halfmax_thrs=0.5, binned_offset_estimation=False, smooth_postprocess=lambda x: x, take_abs=False,
-                  smooth_preprocess=lambda x: x, pfix_dict=None):
+                  halfmax_thrs=0.5, binned_offset_estimation=False, smooth_postprocess=_identity, take_abs=False,
+                  smooth_preprocess=_identity, pfix_dict=None):
         """Guess parameters for a single peak"""
         if data is not None:
             x = data.x_axis
@@ -91,17 +303,26 @@ class PeakedFunction(FitterDefinition):
         if len(x) != len(y):
             raise ValueError("x and y should have the same number of elements!")
 
+        y = np.asarray(y)
+        is_complex = y.dtype.kind == 'c'
+
         if smoothing_window > 1:
-            smoothed_data = smooth_postprocess(
-                complex_savgol_filter(smooth_preprocess(y), smoothing_window, smoothing_order)
-            )
+            if data is not None and smooth_preprocess is _identity:
+                # repeated guesses on the same data (e.g. through derived fitters) can reuse the smoothed trace
+                smoothed_data = _cached_savgol_filter(data, smoothing_window, smoothing_order)
+            else:
+                smoothed_data = complex_savgol_filter(smooth_preprocess(y), smoothing_window, smoothing_order)
+            if smooth_postprocess is not _identity:
+                # the postprocessing may work in-place, so it shouldn't get the (read-only) cached array
+                smoothed_data = smooth_postprocess(np.array(smoothed_data))
         else:
             smoothed_data = y
 
-        if take_abs or np.iscomplexobj(smoothed_data):
+        if take_abs or is_complex:
             smoothed_data_abs = np.abs(smoothed_data)
         else:
-            smoothed_data_abs = smoothed_data.copy()
+            # no copy needed, everything below allocates new arrays rather than modifying this one
+            smoothed_data_abs = smoothed_data
 
         if cls.convert_to_dB:
             smoothed_data_abs = helpers.convert_spectrum_unit(smoothed_data_abs, helpers.SpectrumUnits.LOG_POWER, helpers.SpectrumUnits.LINEAR_POWER)
@@ -122,10 +343,13 @@ class PeakedFunction(FitterDefinition):
 
         # we have already smoothed the signal,
         # so, let's find the closest points left and right with half the amplitude
-        below_halfmax = peaked_signal < halfmax_thrs * peak_height
+        halfmax_level = halfmax_thrs * peak_height
 
-        l_halfmax_idx = idx_max - np.argmax(below_halfmax[:idx_max + 1][::-1])
-        r_halfmax_idx = idx_max + np.argmax(below_halfmax[idx_max:])
+        if _halfmax_indices_kernel is not None and peaked_signal.dtype == np.float64:
+            l_halfmax_idx, r_halfmax_idx = _halfmax_indices_kernel(peaked_signal, idx_max, halfmax_level)
+        else:
+            l_halfmax_idx = idx_max - _first_index_below(peaked_signal[idx_max::-1], halfmax_level)
+            r_halfmax_idx = idx_max + _first_index_below(peaked_signal[idx_max:], halfmax_level)
 
         if l_halfmax_idx == idx_max and r_halfmax_idx == idx_max:
             # this should not occur, because we have subtracted the minimum value already,
@@ -151,23 +375,91 @@ class PeakedFunction(FitterDefinition):
             hwhm = np.mean([dx_l_halfmax, dx_r_halfmax])
 
         # correct for thresholds that are different than 0.5
-        single_peak_y0 = cls.single_peak_func(0.0)
-        dx_0_5 = scipy.optimize.minimize_scalar(lambda s: (cls.single_peak_func(s) / single_peak_y0 - 0.5) ** 2,
-                                                bounds=(0, 1e3), method='bounded').x
-        dx_thrs = scipy.optimize.minimize_scalar(lambda s: (cls.single_peak_func(s) / single_peak_y0 - halfmax_thrs) ** 2,
-                                                 bounds=(0, 1e3), method='bounded').x
-
-        hwhm = hwhm / dx_thrs * dx_0_5
+        hwhm = hwhm * cls._hwhm_correction(halfmax_thrs)
 
         # convert the guessed peak values to function parameters
         func_params = cls.peak_guess_to_func_params(peak_height, hwhm)
 
-        if np.iscomplexobj(y):
+        if is_complex:
             peak_phase = np.angle(smoothed_data[idx_max])
             func_params["peak_phase"] = peak_phase
 
         return dict(**func_params, center=x0, offset=offset)
 
+    @classmethod
+    def fit_batch(cls, x, y, pfix_dict=None, guess_kw=None, **kw):
+        """Fit many traces that share the same x axis in a single least-squares problem.
+
+        Every trace gets its own set of parameters, but all traces are evaluated in one go, which is much faster than
+        fitting them one by one.
+
+        :param x: 1D x axis, shared by all traces.
+        :param y: 2D array of real data of shape ``(n_traces, len(x))``.
+        :param pfix_dict: Parameters that are fixed, for all traces.
+        :param guess_kw: Keyword arguments passed to the guess function for every trace.
+        :param kw: Passed on to :func:`scipy.optimize.least_squares`.
+        :return: A list of :class:`~pylabframe.data.FitResult`, one for every trace.
+        """
+        if pfix_dict is None:
+            pfix_dict = {}
+        if guess_kw is None:
+            guess_kw = {}
+
+        x = np.asarray(x)
+        y = np.asarray(y)
+        if y.ndim != 2 or y.shape[1] != len(x):
+            raise ValueError(f"y should have shape (n_traces, {len(x)}), got {y.shape}")
+        if y.dtype.kind == 'c':
+            raise NotImplementedError("Batch fitting of complex data is not supported")
+
+        n_traces, n_points = y.shape
+        free_params = [pn for pn in cls.param_names if pn not in pfix_dict]
+        n_free = len(free_params)
+
+        p0 = np.array([
+            [cls.guess_func(x=x, y=y_i, pfix_dict=pfix_dict, **guess_kw)[pn] for pn in free_params] for y_i in y
+        ])
+
+        def residuals(params_flat):
+            params = params_flat.reshape(n_traces, n_free)
+            # make every parameter a column vector, such that the fit function broadcasts over all traces at once
+            all_params = {pn: params[:, i, np.newaxis] for i, pn in enumerate(free_params)}
+            all_params.update(pfix_dict)
+            return (cls.fit_func(x, **all_params) - y).reshape(-1)
+
+        # the traces are independent, so the jacobian is block diagonal
+        kw.setdefault("jac_sparsity", scipy.sparse.block_diag([np.ones((n_points, n_free))] * n_traces))
+        res = scipy.optimize.least_squares(residuals, p0.reshape(-1), **kw)
+
+        popt = res.x.reshape(n_traces, n_free)
+        jac = scipy.sparse.csr_matrix(res.jac)
+        fit_x_range = (x.min(), x.max())
+        dof = n_points - n_free
+
+        fit_results = []
+        for i in range(n_traces):
+            trace_rows = slice(i * n_points, (i + 1) * n_points)
+            trace_jac = jac[trace_rows, i * n_free:(i + 1) * n_free].toarray()
+            trace_res = res.fun[trace_rows]
+
+            # same covariance estimate as scipy.optimize.curve_fit
+            if dof > 0:
+                pcov = np.linalg.pinv(trace_jac.T @ trace_jac) * (trace_res @ trace_res / dof)
+            else:
+                pcov = np.full((n_free, n_free), np.inf)
+
+            fit_results.append(FitResult(
+                cls, popt_dict=dict(zip(free_params, popt[i])), perr_dict=dict(zip(free_params, np.sqrt(np.diagonal(pcov)))),
+                pcov=pcov, fit_info={"fvec": trace_res, "nfev": res.nfev}, fit_x_range=fit_x_range, pfix_dict=dict(pfix_dict)
+            ))
+
+        return fit_results
+
+    @classmethod
+    def _hwhm_correction(cls, halfmax_thrs):
+        """Ratio of the peak's half width at half maximum to its half width at ``halfmax_thrs``"""
+        return _peak_fraction_distance(cls, 0.5) / _peak_fraction_distance(cls, halfmax_thrs)
+
     @staticmethod
     def single_peak_func(x, *args, **kwargs):
         raise NotImplementedError("Peak function not defined")
@@ -291,7 +583,15 @@ class Lorentzian(PeakedFunction):
 
     @staticmethod
     def single_peak_func(x, area=1., linewidth=1., center=0., offset=0.):
-        return offset + (2/np.pi) * area * linewidth / (4*(x-center)**2 + linewidth**2)
+        if _lorentzian_kernel is not None and isinstance(x, np.ndarray) and x.ndim == 1 and x.dtype == np.float64:
+            try:
+                return _lorentzian_kernel(x, float(area), float(linewidth), float(center), float(offset))
+            except TypeError:
+                # complex parameters, fall through to numpy
+                pass
+        if np.ndim(x) == 0:
+            return offset + (2/np.pi) * area * linewidth / (4*(x-center)**2 + linewidth**2)
+        return _lorentzian_inplace(x, area, linewidth, center, offset)
 
     @staticmethod
     def peak_guess_to_func_params(peak_height, hwhm):
@@ -301,6 +601,11 @@ class Lorentzian(PeakedFunction):
             "linewidth": 2 * hwhm
         }
 
+    @classmethod
+    def _hwhm_correction(cls, halfmax_thrs):
+        # the peak drops to a fraction f of its maximum at a distance (linewidth/2) * sqrt(1/f - 1) from the center
+        return 1. / np.sqrt(1. / halfmax_thrs - 1.)
+
 
 class LogLorentzian(Lorentzian):
     convert_to_dB = True
@@ -311,7 +616,7 @@ class LorentzianPlusLinear(FitterDefinition):
 
     @classmethod
     def fit_func(cls, x, area, linewidth, center, offset, linear_slope):
-        return offset + (2/np.pi) * area * linewidth / (4*(x-center)**2 + linewidth**2) + (x-center) * linear_slope
+        return Lorentzian.single_peak_func(x, area, linewidth, center, offset) + (x-center) * linear_slope
 
     @classmethod
     def guess_func(cls, data: NumericalData, x=None, y=None, pfix_dict=None):
@@ -328,7 +633,9 @@ class Gaussian(PeakedFunction):
 
     @staticmethod
     def single_peak_func(x, amplitude=1., sigma=1., center=0., offset=0.):
-        return offset + amplitude * np.exp(-0.5 * (x - center) ** 2 / sigma ** 2)
+        if np.ndim(x) == 0:
+            return offset + amplitude * np.exp(-0.5 * (x - center) ** 2 / sigma ** 2)
+        return _gaussian_inplace(x, amplitude, sigma, center, offset)
 
     @staticmethod
     def peak_guess_to_func_params(peak_height, hwhm):
@@ -338,6 +645,11 @@ class Gaussian(PeakedFunction):
             "sigma": 0.8493 * hwhm
         }
 
+    @classmethod
+    def _hwhm_correction(cls, halfmax_thrs):
+        # the peak drops to a fraction f of its maximum at a distance sigma * sqrt(-2 ln f) from the center
+        return np.sqrt(np.log(2.) / -np.log(halfmax_thrs))
+
 
 class Line(FitterDefinition):
     param_names = ["a", "b"]
@@ -355,7 +667,7 @@ class Line(FitterDefinition):
             x = data.x_axis
             y = data.data_array
 
-        a, b = np.polyfit(x, y, deg=1)
+        a, b = _linear_regression(x, y)
 
         return {
             "a": a,
@@ -379,7 +691,7 @@ class Exponential(FitterDefinition):
             x = data.x_axis
             y = data.data_array
 
-        a, b = np.polyfit(x, np.log(np.abs(y)), deg=1)
+        a, b = _linear_regression(x, np.log(np.abs(y)))
 
         return {
             "rate": a,
@@ -391,6 +703,16 @@ class Exponential(FitterDefinition):
 class BesselJ(FitterDefinition):
     param_names = ["amplitude", "x_pi", "order", "offset_y", "offset_x", "exponent"]
 
+    lookup_points_per_unit = None
+    """If set, Bessel functions of a fixed, integer order are linearly interpolated from a cached table with this many
+    points per unit of the function argument, rather than evaluated exactly. Speeds up fitting at the cost of a (small)
+    interpolation error, which scales as ``1 / lookup_points_per_unit**2``. Subclass or set to e.g. 1000 to enable.
+
+    The table is only used if ``order`` is fixed to an ``int`` (e.g. ``pfix_dict={"order": 1}``). If the order is a fit
+    parameter, it is always evaluated exactly: switching to the table whenever the optimizer hits an integer value would
+    make the model discontinuous."""
+    _jv_tables = {}
+
     @classmethod
     def guess_func(cls, data: NumericalData, x=None, y=None, order=None, pfix_dict=None, offset_y=0., initial_slope_idx=1, exponent=1.):
         if order is None:
@@ -427,4 +749,28 @@ class BesselJ(FitterDefinition):
 
     @classmethod
     def fit_func(cls, x, amplitude, x_pi, order=1, offset_y=0.0, offset_x=0.0, exponent=1.):
-        return offset_y + amplitude*scipy.special.jv(order, np.pi*(x-offset_x)/x_pi)**exponent
+        u = np.pi*(x-offset_x)/x_pi
+        # the optimizer passes fitted parameters as floats, so only a fixed order can be an int
+        if cls.lookup_points_per_unit is not None and isinstance(order, (int, np.integer)):
+            jv = cls._jv_lookup(int(order), u)
+        else:
+            jv = scipy.special.jv(order, u)
+        return offset_y + amplitude*jv**exponent
+
+    @classmethod
+    def _jv_lookup(cls, order, u):
+        abs_u = np.abs(u)
+        key = (order, cls.lookup_points_per_unit)
+        table = cls._jv_tables.get(key)
+        if table is None or table[0][-1] < np.max(abs_u):
+            # grow the table in powers of two, so it isn't recomputed for every slightly larger argument
+            table_max = 2. ** np.ceil(np.log2(max(np.max(abs_u), 1.)))
+            u_grid = np.linspace(0., table_max, int(table_max * cls.lookup_points_per_unit) + 1)
+            table = (u_grid, scipy.special.jv(order, u_grid))
+            cls._jv_tables[key] = table
+
+        jv = np.interp(abs_u, *table)
+        # for integer orders, J_n(-u) = (-1)^n J_n(u)
+        if order % 2 == 1:
+            jv = np.where(u < 0, -jv, jv)
+        return jv
@@ -1,61 +1,150 @@
 import datetime
 import glob
 import os.path
+import time
 
 from .. import config
 
 
+# the data settings are read several times for every file that is saved. keep them around until the config changes
+_data_settings_cache = None
+_data_settings_version = None
+
+
+def _data_settings():
+    global _data_settings_cache, _data_settings_version
+    if _data_settings_version != config._settings_version:
+        _data_settings_cache = {k: config.get(f"data.{k}") for k in config._default_settings['data']}
+        _data_settings_version = config._settings_version
+    return _data_settings_cache
+
+
 def root_dir():
-    return os.path.expanduser(config.get('data.root_dir'))
+    return os.path.expanduser(_data_settings()['root_dir'])
+
+
+# time.strftime skips building a datetime object, which is noticeably cheaper. it doesn't know about the
+# datetime-only format codes though, so for those we still go through datetime
+_DATETIME_ONLY_CODES = ("%f", "%z", "%Z", "%:z")
+
+
+def _strftime_now(fmt):
+    if any(code in fmt for code in _DATETIME_ONLY_CODES):
+        return datetime.datetime.now().strftime(fmt)
+    return time.strftime(fmt)
 
 
 def current_datestamp(as_string=True):
-    cur_date = datetime.datetime.now() - datetime.timedelta(hours=config.get('data.day_starts_hour'))
+    day_starts_hour = _data_settings()['day_starts_hour']
+    if as_string and day_starts_hour == 0:
+        return _strftime_now(_data_settings()['datestamp_fmt'])
+
+    cur_date = datetime.datetime.now() - datetime.timedelta(hours=day_starts_hour)
 
     if not as_string:
         return cur_date.date()
     else:
-        return cur_date.strftime(config.get('data.datestamp_fmt'))
+        return cur_date.strftime(_data_settings()['datestamp_fmt'])
 
 
 def current_timestamp(as_string=True):
-    cur_time = datetime.datetime.now()
+    if as_string:
+        return _strftime_now(_data_settings()['timestamp_fmt'])
 
-    if not as_string:
-        return cur_time.time()
-    else:
-        return cur_time.strftime(config.get('data.timestamp_fmt'))
+    return datetime.datetime.now().time()
 
 
-def today_dir():
-    if not os.path.isdir(root_dir()):
-        raise FileNotFoundError(f"Root data directory {root_dir()} not found")
+# today's directory is looked up on every save, so remember it. keyed by (root dir, datestamp), such that a new day
+# or a different root dir triggers a new search
+_today_dir_cache = {}
+
 
+def today_dir():
+    cur_root = root_dir()
     cur_ds = current_datestamp()
-    search_glob = os.path.join(root_dir(), f"{cur_ds}*")
-    matches = glob.glob(search_glob)
+
+    cached = _today_dir_cache.get((cur_root, cur_ds))
+    # still check that the directory exists, it's a single stat
+    if cached is not None and os.path.isdir(cached):
+        return cached
+
+    if not os.path.isdir(cur_root):
+        raise FileNotFoundError(f"Root data directory {cur_root} not found")
+
+    # we only need to know whether there are multiple matches, not what they all are
+    matches = _prefix_matches(cur_root, cur_ds, max_matches=2)
 
     if len(matches) == 0:
-        raise FileNotFoundError(f"No data directory found for date {cur_ds} in {root_dir()}")
+        raise FileNotFoundError(f"No data directory found for date {cur_ds} in {cur_root}")
     elif len(matches) > 1:
-        raise Warning(f"Multiple data directories found for date {cur_ds} in {root_dir()}")
+        raise Warning(f"Multiple data directories found for date {cur_ds} in {cur_root}")
 
+    _today_dir_cache[(cur_root, cur_ds)] = matches[0]
     return matches[0]
 
 
+def clear_today_dir_cache():
+    """Forget the remembered location of today's data directory, e.g. after it has been renamed or moved."""
+    _today_dir_cache.clear()
+
+
+def _has_wildcards(pattern):
+    return any(c in pattern for c in "*?[")
+
+
+def _iter_dir_names(parent):
+    try:
+        with os.scandir(parent if parent else os.curdir) as it:
+            for entry in it:
+                yield entry.name
+    except (FileNotFoundError, NotADirectoryError):
+        # glob doesn't complain about non-existing directories either
+        return
+
+
+def _prefix_matches(parent, prefix, max_matches=None, dir_cache=None):
+    """Paths in parent that start with prefix, equivalent to glob.glob(os.path.join(parent, prefix + '*'))
+    for prefixes without wildcards, but without the pattern matching.
+
+    If dir_cache (a dict) is given, directory listings are looked up in and stored in there."""
+    if _has_wildcards(prefix) or os.sep in prefix or (os.altsep and os.altsep in prefix):
+        # the prefix spans several directory levels (or is a pattern itself), leave that to glob
+        return glob.glob(os.path.join(parent, f"{prefix}*") if parent else f"{prefix}*")[:max_matches]
+
+    if dir_cache is not None:
+        if parent not in dir_cache:
+            dir_cache[parent] = tuple(_iter_dir_names(parent))
+        names = dir_cache[parent]
+    else:
+        names = _iter_dir_names(parent)
+
+    # like glob, match case-insensitively on case-insensitive platforms (i.e. Windows)
+    nc_prefix = os.path.normcase(prefix)
+    matches = []
+    for name in names:
+        # like glob, hidden entries only match if the prefix starts with a dot as well
+        if os.path.normcase(name).startswith(nc_prefix) and (prefix.startswith(".") or not name.startswith(".")):
+            matches.append(os.path.join(parent, name) if parent else name)
+            if max_matches is not None and len(matches) >= max_matches:
+                break
+
+    return matches
+
+
 def save_path(*args, add_timestamp=None, timestamp=None, ts_suffix=None, parent_dir=None, create_dirs=True, verbose=True, exist_ok=False):
     if len(args) == 0:
         raise ValueError('No filename specified')
     if parent_dir is None:
         parent_dir = today_dir()
     if add_timestamp is None:
-        add_timestamp = config.get('data.default_add_timestamp')
+        add_timestamp = _data_settings()['default_add_timestamp']
+    # the timestamp is formatted once, here, and reused for all path components
     if timestamp is None:
-        timestamp = datetime.datetime.now()
-    if not isinstance(timestamp, str):
-        timestamp = timestamp.strftime(config.get('data.timestamp_fmt'))
+        timestamp = current_timestamp()
+    elif not isinstance(timestamp, str):
+        timestamp = timestamp.strftime(_data_settings()['timestamp_fmt'])
     if ts_suffix is None:
-        ts_suffix = config.get('data.timestamp_suffix')
+        ts_suffix = _data_settings()['timestamp_suffix']
 
     args = list(args)
 
@@ -67,12 +156,15 @@ def save_path(*args, add_timestamp=None, timestamp=None, ts_suffix=None, parent_
 
     if len(args) > 1 and create_dirs:
         if parent_dir:
-            dir_path = os.path.join(parent_dir, args[:-1])
+            dir_path = os.path.join(parent_dir, *args[:-1])
         else:
-            dir_path = os.path.join(args[:-1])
-        if verbose:
-            print(f" > creating directory: {dir_path}")
-        os.makedirs(dir_path, exist_ok=True)
+            dir_path = os.path.join(*args[:-1])
+        # when saving many files in the same subdirectory, it usually exists already. checking that is a single stat,
+        # while makedirs goes through every level of the path
+        if not os.path.isdir(dir_path):
+            if verbose:
+                print(f" > creating directory: {dir_path}")
+            os.makedirs(dir_path, exist_ok=True)
 
     if parent_dir:
         args = [parent_dir] + args
@@ -89,43 +181,45 @@ class TimestampedDir:
         if parent_dir is None:
             parent_dir = today_dir()
         if timestamp is None:
-            timestamp = datetime.datetime.now()
-        if not isinstance(timestamp, str):
-            timestamp = timestamp.strftime(config.get('data.timestamp_fmt'))
+            timestamp = current_timestamp()
+        elif not isinstance(timestamp, str):
+            timestamp = timestamp.strftime(_data_settings()['timestamp_fmt'])
         if ts_suffix is None:
-            ts_suffix = config.get('data.timestamp_suffix')
+            ts_suffix = _data_settings()['timestamp_suffix']
 
         self.parent_dir = parent_dir
         self.name = name
         self.dir_name = timestamp + ts_suffix + name
 
+        # the directory doesn't change over the lifetime of this object, so only join its path once
+        if self.parent_dir:
+            self.dir_path = os.path.join(self.parent_dir, self.dir_name)
+        else:
+            self.dir_path = self.dir_name
+
         if verbose:
             print(f"Saving data in directory: {self.dir_name}")
 
         if create_dirs:
-            if self.parent_dir:
-                dir_path = os.path.join(self.parent_dir, self.dir_name)
-            else:
-                dir_path = self.dir_name
-
             if verbose:
-                print(f" > creating directory: {dir_path}")
-            os.makedirs(dir_path, exist_ok=True)
+                print(f" > creating directory: {self.dir_path}")
+            os.makedirs(self.dir_path, exist_ok=True)
 
     def file(self, *args, verbose=True, exists_ok=False):
         if verbose:
             print(f"Saving current measurement as: {os.path.join(self.dir_name, *args)}")
-        if self.parent_dir:
-            cur_path = os.path.join(self.parent_dir, self.dir_name, *args)
-        else:
-            cur_path = os.path.join(self.dir_name, *args)
+        cur_path = os.path.join(self.dir_path, *args)
         if not exists_ok and os.path.exists(cur_path):
             raise FileExistsError(cur_path)
 
         return cur_path
 
 
-def find_path(*args, parent_dir=None, in_today=False, return_multiple=False, return_full_path=True):
+def find_path(*args, parent_dir=None, in_today=False, return_multiple=False, return_full_path=True, exact=False, dir_cache=None):
+    """Find a file or directory by the start of its name, descending one directory level per argument.
+
+    Pass the same dict as dir_cache to multiple calls to reuse the directory listings between them. The listings are
+    not refreshed, so only do this for directories that don't change in the meantime."""
     if parent_dir is None:
         if in_today:
             parent_dir = today_dir()
@@ -134,14 +228,27 @@ def find_path(*args, parent_dir=None, in_today=False, return_multiple=False, ret
 
     cur_parent = parent_dir
     for i, a in enumerate(args):
-        search_glob = f"{a}*"
-        if cur_parent:
-            search_glob = os.path.join(cur_parent, search_glob)
-        matches = glob.glob(search_glob)
+        if exact and not _has_wildcards(a):
+            # literal name, no need to list the directory
+            candidate = os.path.join(cur_parent, a) if cur_parent else a
+            matches = [candidate] if os.path.exists(candidate) else []
+        elif _has_wildcards(a):
+            search_glob = a if exact else f"{a}*"
+            if cur_parent:
+                search_glob = os.path.join(cur_parent, search_glob)
+            matches = glob.glob(search_glob)
+        else:
+            # plain prefix: a single directory scan will do, and unless we want all of them we can stop at two matches
+            want_all = i == len(args) - 1 and return_multiple
+            matches = _prefix_matches(cur_parent, a, max_matches=None if want_all else 2, dir_cache=dir_cache)
+        pattern = a if exact else f"{a}*"
         if len(matches) == 0:
-            raise FileNotFoundError(f"Can't find '{a}*' in {cur_parent}")
+            raise FileNotFoundError(f"Can't find '{pattern}' in {cur_parent}")
         if (i < len(args) - 1 or not return_multiple) and len(matches) > 1:
-            raise RuntimeError(f"Too many matches for '{a}*' in {cur_parent}: {matches}")
+            if not exact and not _has_wildcards(a):
+                # the scan stopped at two matches, list them all in the error
+                matches = _prefix_matches(cur_parent, a, dir_cache=dir_cache)
+            raise RuntimeError(f"Too many matches for '{pattern}' in {cur_parent}: {matches}")
 
         if i == len(args) - 1 and return_multiple:
             cur_parent = matches
@@ -154,7 +261,7 @@ def find_path(*args, parent_dir=None, in_today=False, return_multiple=False, ret
         if return_multiple:
             return [os.path.split(p)[1] for p in cur_parent]
         else:
-            return os.path.split(p)[1]
+            return os.path.split(cur_parent)[1]
 
 
 def expand_default_save_location(file, add_timestamp=None, timestamp=None, ts_suffix=None, create_dirs=True, verbose=True, exist_ok=False, save_location_option=None):
@@ -164,7 +271,7 @@ def expand_default_save_location(file, add_timestamp=None, timestamp=None, ts_su
         return file  # don't need to do any expansion
 
     if save_location_option is None:
-        save_location_option = config.get("data.default_save_location")
+        save_location_option = _data_settings()['default_save_location']
     if save_location_option == 'cwd':
         if not exist_ok and os.path.exists(file):
             raise FileExistsError(file)
@@ -190,13 +297,7 @@ def require_today_dir():
         today_dir()
     except FileNotFoundError:
         new_dir = input("Please enter a new for today's data directory: ")
-        new_dir = current_datestamp() + config.get('data.datestamp_suffix') + new_dir
+        new_dir = current_datestamp() + _data_settings()['datestamp_suffix'] + new_dir
 
         td = os.path.join(root_dir(), new_dir)
         os.mkdir(td)
-
-
-@config.register_post_config_hook
-def _post_config():
-    if config.get('data.require_today_dir'):
-        require_today_dir()
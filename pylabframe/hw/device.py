@@ -7,6 +7,10 @@ It also provides a few convenience functions to deal with typical device respons
 """
 
 import copy
+import asyncio
+import functools
+import importlib
+import threading
 
 from .. import config
 from enum import Enum
@@ -31,7 +35,6 @@ def get_device(id, driver=None, **extra_settings):
 
 
 def _connect_device(id, driver=None, **extra_settings):
-    from . import drivers
     hw_conf = config.get('devices')
     device_settings = copy.deepcopy(hw_conf[id])
 
@@ -50,25 +53,7 @@ def _connect_device(id, driver=None, **extra_settings):
             if not "." in driver:
                 raise RuntimeError("Device driver class object not registered directly. Device driver strings should include the module from which the driver class should be imported.")
 
-            # work out the module from which the driver should be imported
-            # e.g. if driver == "my.custom.module.FancyLaser", then driver_module == "my.custom.module"
-            split_class = driver.split(".")
-            driver_module = split_class[:-1]
-            driver_module = ".".join(driver_module)
-
-            # check if the driver is specified as a custom driver
-            is_custom_driver = False
-            for m in config.get("drivers.modules", []):
-                if driver_module == m or driver_module.startswith(m + "."):
-                    is_custom_driver = True
-                    break
-
-            if is_custom_driver:
-                exec(f"import {driver_module}")
-                driver = eval(f"{driver}")
-            else:
-                exec(f"from .drivers import {driver_module}")
-                driver = eval(f"drivers.{driver}")
+            driver = _import_driver_class(driver, tuple(config.get("drivers.modules", [])))
 
     device_settings.update(extra_settings)
 
@@ -77,6 +62,29 @@ def _connect_device(id, driver=None, **extra_settings):
     return dev
 
 
+@functools.lru_cache(maxsize=None)
+def _import_driver_class(driver, custom_modules):
+    # the driver class only depends on the driver string and the registered custom driver modules, so it's only
+    # resolved once. call _import_driver_class.cache_clear() after reloading a driver module
+
+    # work out the module from which the driver should be imported
+    # e.g. if driver == "my.custom.module.FancyLaser", then driver_module == "my.custom.module"
+    driver_module, driver_class = driver.rsplit(".", 1)
+
+    # check if the driver is specified as a custom driver
+    is_custom_driver = False
+    for m in custom_modules:
+        if driver_module == m or driver_module.startswith(m + "."):
+            is_custom_driver = True
+            break
+
+    if is_custom_driver:
+        module = importlib.import_module(driver_module)
+    else:
+        module = importlib.import_module(f".drivers.{driver_module}", __package__)
+    return getattr(module, driver_class)
+
+
 def register_device(id, driver, **settings):
     if "." in id:
         raise ValueError(f"Device ids cannot have a . (dot). Got: {id}")
@@ -116,6 +124,19 @@ class Device:
     Device subclasses may define their own ``METADATA_FIELDS`` attribute -- these will be collected automatically.
     """
 
+    X_AXIS_DTYPE = "float64"
+    """Data type of the x-axes (e.g. time or frequency) of acquired traces. Can be overridden per device with the
+    ``x_axis_dtype`` setting.
+
+    ``float32`` halves the memory taken up by the axes, but only has ~7 significant digits: it can't resolve e.g. a
+    1 kHz span around 1 GHz. So only use it if you know your axes don't need the precision."""
+
+    SHARE_AXES = False
+    """If True, acquisitions with the same axis settings return one and the same x-axis array, rather than each their
+    own copy. This saves computing and storing the axis for every trace, but the shared axes are read-only: modifying
+    them in place (e.g. ``data.x_axis -= f0``) raises an error. Can be overridden per device with the ``share_axes``
+    setting."""
+
     def __init__(self, id, error_on_double_connect=True, settings=None):
         """Construct a new device. Should only be called from the constructor of a subclass implementing an actual device.
 
@@ -127,28 +148,46 @@ class Device:
         """
         if id in _connected_devices and error_on_double_connect:
             raise RuntimeError(f"Device {id} already connected")
+        self.id = id
+
+        # maps metadata keys to the names of the attributes they are read from. we store names rather than bound getters,
+        # which would keep a reference to the device and thereby delay closing the connection until garbage collection
+        self.metadata_registry = {mf: mf for mf in self._all_metadata_fields()}
+
+        if settings is None:
+            settings = {}
+
+        self.settings = copy.deepcopy(self.DEFAULT_SETTINGS)
+        self.settings.update(settings)
 
+        # serializes the calls that run_async hands to worker threads, such that they don't interleave on the connection
+        self._async_lock = threading.Lock()
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def _all_metadata_fields(cls):
+        # this only depends on the class, so it's worked out once rather than for every new device object
         metadata_fields = []
 
         # combine all default parameters from subclasses
         # process bottom to top (so subclasses can override params)
-        subclasses = self.__class__.__mro__[::-1]
+        subclasses = cls.__mro__[::-1]
         for subcl in subclasses:
             if hasattr(subcl, "METADATA_FIELDS"):
                 metadata_fields += subcl.METADATA_FIELDS
 
         # get unique fields
-        metadata_fields = list(dict.fromkeys(metadata_fields))
+        return tuple(dict.fromkeys(metadata_fields))
 
-        self.metadata_registry = {}
-        for mf in metadata_fields:
-            self.metadata_registry[mf] = lambda self=self, mf=mf: getattr(self, mf)
-
-        if settings is None:
-            settings = {}
+    @property
+    def x_axis_dtype(self):
+        """Data type to use for x-axes, from the ``x_axis_dtype`` setting or :attr:`X_AXIS_DTYPE` otherwise."""
+        return self.settings.get("x_axis_dtype", self.X_AXIS_DTYPE)
 
-        self.settings = copy.deepcopy(self.DEFAULT_SETTINGS)
-        self.settings.update(settings)
+    @property
+    def share_axes(self):
+        """Whether acquired traces share their x-axes, from the ``share_axes`` setting or :attr:`SHARE_AXES` otherwise."""
+        return self.settings.get("share_axes", self.SHARE_AXES)
 
     @classmethod
     def list_available(cls):
@@ -160,14 +199,44 @@ class Device:
 
         :return: dict of parameter names and values
         """
-        metadata_collection = {}
-        for k, v in self.metadata_registry.items():
-            value = v()
-            if isinstance(value, SettingEnum):
-                value = value.name
-            metadata_collection[k] = value
-
-        return metadata_collection
+        return {k: (v.name if isinstance(v, SettingEnum) else v) for k, v in self._read_metadata_values().items()}
+
+    def _read_metadata_values(self) -> dict:
+        # raw values of the metadata fields. device types that can read out several parameters at once override this
+        return {k: getattr(self, attr) for k, attr in self.metadata_registry.items()}
+
+    async def run_async(self, func, *args, **kw):
+        """Run a blocking device method in a worker thread, such that an :mod:`asyncio` event loop can drive several
+        devices at the same time. Calls on the same device are still carried out one after the other.
+
+        Example: ``await asyncio.gather(esa.run_async(esa.acquire_trace), scope.run_async(scope.acquire_channel_waveform, 1))``
+
+        :param func: the method to call, e.g. ``dev.acquire_trace``.
+        :param args: positional arguments passed on to ``func``.
+        :param kw: keyword arguments passed on to ``func``.
+        :return: the return value of ``func``.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self._call_locked, func, *args, **kw))
+
+    def _call_locked(self, func, *args, **kw):
+        with self._async_lock:
+            return func(*args, **kw)
+
+    def close(self):
+        """Close the connection to the device. In the generic ``Device`` class, this only unregisters the device, such
+        that the next :func:`get_device` call for its id connects anew. Subclasses should call this after closing
+        their connection."""
+        # only if it's this object that is registered, not e.g. a second connection made with error_on_double_connect=False
+        id = getattr(self, "id", None)
+        if _connected_devices.get(id) is self:
+            del _connected_devices[id]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 
 ## Functions and classes that facilitate data conversion to and from SCPI strings
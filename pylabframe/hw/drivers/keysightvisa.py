@@ -1,13 +1,32 @@
 """Device drivers to control Keysight (formerly Agilent) equipment."""
+import sys
+import functools
+
 import numpy as np
 from enum import Enum
 
 from pylabframe.hw import device, visadevice
 from pylabframe.hw.device import str_conv, SettingEnum, intbool_conv
-from pylabframe.hw.visadevice import visa_property, visa_command
+from pylabframe.hw.visadevice import visa_property, visa_command, cache_reads
 import pylabframe.data
 
 
+@functools.lru_cache(maxsize=16)
+def _cached_linear_axis(start, stop, num, dtype):
+    # consecutive acquisitions mostly have the same axis settings, so the axes are computed once. the cached arrays are
+    # read-only, so that they can't be modified through any of the data objects they're handed to
+    axis = np.linspace(start, stop, num=num, dtype=dtype)
+    axis.setflags(write=False)
+    return axis
+
+
+def _linear_axis(start, stop, num, dtype, share=False):
+    # unless the device shares its axes (see Device.SHARE_AXES), every data object gets a (writeable) copy of its own.
+    # copying the cached axis is still cheaper than computing it anew
+    axis = _cached_linear_axis(start, stop, num, dtype)
+    return axis if share else axis.copy()
+
+
 class KeysightESA(visadevice.VisaDevice):
     class RunModes(SettingEnum):
         """Available run modes.
@@ -148,8 +167,12 @@ class KeysightESA(visadevice.VisaDevice):
     ]
     """""" # remove superclass docstring
 
-    def __init__(self, *args, read_termination='\n', write_termination='\n', **kwargs):
-        super().__init__(*args, read_termination=read_termination, write_termination=write_termination, **kwargs)
+    BATCH_METADATA_QUERIES = True
+    READ_TERMINATION = "\n"
+    WRITE_TERMINATION = "\n"
+    # traces are transferred as binary blocks of up to several MB. with pyvisa's default chunk size (20 kB) those
+    # are read in many small pieces, a larger chunk size saves most of those reads
+    CHUNK_SIZE = 1024*1024
 
     # access guard methods
     def require_iq_mode(self):
@@ -170,8 +193,18 @@ class KeysightESA(visadevice.VisaDevice):
                                                                                        access_guard=access_guard)
     """Define VISA property that is only accessible in IQ mode."""
 
-    instrument_mode = visa_property("inst:sel", dtype=InstrumentModes)
-    """Instrument mode. Options listed in :class:`~InstrumentModes`."""
+    def _reset_trace_transfer(self):
+        # switching modes can reset the trace transfer format on the instrument, so it has to be set up again
+        self._trace_transfer_datatype = None
+
+    # the mode guards read this on every access of a mode-specific property. it's not cached for the whole connection,
+    # since the mode can also be changed from the front panel. within a cache_scope() (which acquire_trace and the
+    # other measurement methods use), it's only queried once though
+    instrument_mode = visa_property("inst:sel", dtype=InstrumentModes, on_write=_reset_trace_transfer)
+    """Instrument mode. Options listed in :class:`~InstrumentModes`.
+
+    To access several mode-specific properties without querying the mode for each of them, access them within a
+    :meth:`~pylabframe.hw.visadevice.VisaDevice.cache_scope`."""
     run_mode = visa_property("initiate:continuous", dtype=RunModes)
     """Run mode. Options listed in :class:`~RunModes`"""
 
@@ -213,21 +246,45 @@ class KeysightESA(visadevice.VisaDevice):
     """Scale type to be used for y-axis of trace (linear, logarthmic). Options listed in :class:`~ScaleType`."""
 
     start_trace = visa_command("initiate:immediate")
-    """Start the acquisition of a trace."""
-    # start_measurement_and_wait = visa_command("initiate:immediate", wait_until_done=True)
+    """Start the acquisition of a trace. Pass ``wait_until_done=True`` to wait for the acquisition to finish."""
+
+    TRANSFER_DATATYPES = {"d": "real,64", "f": "real,32"}
+    # have the instrument send binary data in our native byte order, such that it can be used as-is on arrival
+    TRANSFER_BIG_ENDIAN = sys.byteorder == "big"
+    # transfer format that the instrument was last set up for, None if unknown
+    _trace_transfer_datatype = None
+
+    def initialize_trace_transfer(self, datatype="d"):
+        """Set the instrument up to transfer trace data. No need to call directly -- automatically called by :meth:`~acquire_trace`.
+
+        The format is only sent when it differs from the one set up last time. It is sent again after a change of
+        :attr:`instrument_mode` and after :meth:`invalidate_cache`.
+
+        :param datatype: ``"d"`` to transfer 64-bit floats (default), ``"f"`` to transfer 32-bit floats.
+        """
+        if datatype == self._trace_transfer_datatype:
+            return
+        border = "norm" if self.TRANSFER_BIG_ENDIAN else "swap"
+        self.instr.write(f"format:data {self.TRANSFER_DATATYPES[datatype]};:format:border {border}")
+        self._trace_transfer_datatype = datatype
+
+    def invalidate_cache(self):
+        # a reset also resets the transfer format, so it has to be set up again
+        super().invalidate_cache()
+        self._trace_transfer_datatype = None
 
-    def initialize_trace_transfer(self):
-        """Set the instrument up to transfer trace data. No need to call directly -- automatically called by :meth:`~acquire_trace`."""
-        self.instr.write("format:data real,64")
-        self.instr.write("format:border norm")
+    def start_single_trace(self, wait_until_done=False):
+        """Start the acquistion of a single trace.
 
-    def start_single_trace(self):
-        """Start the acquistion of a single trace."""
+        :param wait_until_done: If True, wait for the acquisition to be finished. The wait is chained onto the start command, saving a separate write.
+        :type wait_until_done: bool, optional
+        """
         self.run_mode = self.RunModes.SINGLE
-        self.start_trace()
+        self.start_trace(wait_until_done=wait_until_done)
 
     # TODO: is this the best name for this function?
-    def acquire_trace(self, trace_num=1, collect_metadata=True, psd=False, restart=True, wait_until_done=True) -> pylabframe.data.NumericalData:
+    @cache_reads
+    def acquire_trace(self, trace_num=1, collect_metadata=True, psd=False, restart=True, wait_until_done=True, transfer_datatype="d") -> pylabframe.data.NumericalData:
         """Transfer a spectrum trace to the PC. Optionally starts a new acquisition.
 
         :param trace_num: Index of the trace to transfer, defaults to 1.
@@ -240,37 +297,52 @@ class KeysightESA(visadevice.VisaDevice):
         :type restart: bool, optional
         :param wait_until_done: If True (default), wait for acquistion to be finished.
         :type wait_until_done: bool, optional
+        :param transfer_datatype: ``"d"`` (default) to transfer the trace as 64-bit floats, ``"f"`` to transfer 32-bit floats. The latter halves the amount of data to transfer, at ~7 significant digits.
+        :type transfer_datatype: str, optional
         :return: A :class:`~pylabframe.data.NumericalData` object holding the spectrum data, frequency axis (Hz) and metadata.
                  If ``psd`` is False, the returned data is a spectrum on a logarithmic scale (dBm).
                  If ``psd`` is True, the returned data is a spectral density on a linear scale (W/Hz).
         """
-        self.initialize_trace_transfer()
-        if restart:
-            self.start_single_trace()
-        if wait_until_done:
+        self.initialize_trace_transfer(transfer_datatype)
+        if restart and wait_until_done and collect_metadata and self.BATCH_METADATA_QUERIES:
+            # the settings don't change during a sweep, so the metadata is read out in the same exchange that starts the
+            # sweep and waits for it. we're in a cache scope, so collect_metadata() below takes the values read here
+            self.run_mode = self.RunModes.SINGLE
+            self.read_properties(self._metadata_visa_properties(), wait_for="initiate:immediate")
+        elif restart:
+            self.start_single_trace(wait_until_done=wait_until_done)
+        elif wait_until_done:
             self.wait_until_done()
-        raw_data = self.instr.query_binary_values(f"trace:data? trace{trace_num}", datatype="d", is_big_endian=True, container=np.array)
+        raw_data = self.query_binary_array(f"trace:data? trace{trace_num}", datatype=transfer_datatype, is_big_endian=self.TRANSFER_BIG_ENDIAN)
 
         if collect_metadata:
             metadata = self.collect_metadata()
         else:
             metadata = {}
 
-        if self.span == 0.0:
-            # we're zero-spanning, x-axis is time axis
-            x_axis = np.linspace(0.0, self.sweep_time, num=self.trace_points)
-            metadata["x_unit"] = 's'
-            metadata['x_label'] = 'time'
-        else:
-            x_axis = np.linspace(self.start_frequency, self.stop_frequency, num=self.trace_points)
-            metadata["x_unit"] = 'Hz'
-            metadata["x_label"] = "frequency"
+        # the settings needed for the x-axis are usually part of the metadata that was just read out. only query the
+        # ones that aren't, in one go rather than property by property
+        axis_fields = ["span", "sweep_time", "trace_points", "start_frequency", "stop_frequency", "rbw"]
+        axis_settings = {k: metadata[k] for k in axis_fields if k in metadata}
+        missing_fields = [k for k in axis_fields if k not in axis_settings]
+        if missing_fields:
+            axis_settings.update(self.read_properties(missing_fields))
 
+        x_axis, metadata["x_unit"], metadata["x_label"] = self._build_x_axis(axis_settings)
         metadata["y_label"] = 'signal'
 
         if psd:
-            sig_power = 1e3 * np.power(10., raw_data / 10.0)
-            sig_psd = sig_power / self.rbw
+            # dBm -> W/Hz as 1e3 * 10**(dBm / 10) / rbw, but done in-place on a single buffer rather than with a
+            # temporary array for every operation. numpy's exp is SIMD-vectorized, which makes this faster than a
+            # compiled (numba) loop, as that calls the scalar exp for every point
+            # the received float64 trace isn't returned itself, so it serves as that buffer
+            if raw_data.dtype == np.float64 and raw_data.flags.writeable:
+                sig_psd = raw_data
+            else:
+                sig_psd = np.empty(raw_data.shape, dtype=np.float64)
+            np.multiply(raw_data, np.log(10.) / 10., out=sig_psd)
+            np.exp(sig_psd, out=sig_psd)
+            sig_psd *= 1e3 / axis_settings["rbw"]
             trace_sig = sig_psd
             metadata["y_unit"] = 'W/Hz'
         else:
@@ -280,6 +352,16 @@ class KeysightESA(visadevice.VisaDevice):
         data_obj = pylabframe.data.NumericalData(trace_sig, x_axis=x_axis, metadata=metadata)
         return data_obj
 
+    def _build_x_axis(self, axis_settings):
+        # returns the x-axis of a trace, with its unit and label
+        if axis_settings["span"] == 0.0:
+            # we're zero-spanning, x-axis is time axis
+            start, stop, unit, label = 0.0, axis_settings["sweep_time"], 's', 'time'
+        else:
+            start, stop, unit, label = axis_settings["start_frequency"], axis_settings["stop_frequency"], 'Hz', 'frequency'
+
+        return _linear_axis(start, stop, axis_settings["trace_points"], self.x_axis_dtype, self.share_axes), unit, label
+
     ## IQ MODE SETTINGS
     configure_iq_waveform = visa_command("configure:waveform")
     """Configure the instrument in IQ waveform mode."""
@@ -293,6 +375,7 @@ class KeysightESA(visadevice.VisaDevice):
         self.instrument_mode = self.InstrumentModes.IQ_ANALYZER
         self.configure_iq_waveform()
 
+    @cache_reads
     def acquire_iq_waveform(self, return_complex=False, restart=True, wait_until_done=True):
         """Transfer an IQ trace to the PC. Optionally starts a new acquisition.
 
@@ -308,19 +391,16 @@ class KeysightESA(visadevice.VisaDevice):
         """
         self.initialize_trace_transfer()
         if restart:
-            self.start_single_trace()
-        if wait_until_done:
+            self.start_single_trace(wait_until_done=wait_until_done)
+        elif wait_until_done:
             self.wait_until_done()
-        raw_data = self.instr.query_binary_values(f"fetch:waveform0?", datatype="d", is_big_endian=True,
-                                                  container=np.array)
-        envelope_data = self.instr.query_binary_values(f"fetch:waveform2?", datatype="d", is_big_endian=True,
-                                                  container=np.array)
-        statistics_data = self.instr.query_binary_values(f"fetch:waveform1?", datatype="d", is_big_endian=True,
-                                                  container=np.array)
-        i_data = raw_data[::2]
-        q_data = raw_data[1::2]
+        raw_data = self.query_binary_array(f"fetch:waveform0?", datatype="d", is_big_endian=self.TRANSFER_BIG_ENDIAN)
+        # the envelope and statistics are short, so they're fetched together
+        envelope_data, statistics_data = self.query_binary_arrays(["fetch:waveform2?", "fetch:waveform1?"], datatype="d", is_big_endian=self.TRANSFER_BIG_ENDIAN)
+        # the instrument sends interleaved I, Q pairs. as rows of a (points, 2) view, the pairs can be used without copying
+        iq_pairs = raw_data.reshape(-1, 2)
 
-        time_axis = np.linspace(0, self.iq_acquisition_time, len(i_data))
+        time_axis = _linear_axis(0.0, self.iq_acquisition_time, len(iq_pairs), self.x_axis_dtype, self.share_axes)
 
         metadata = {
             "center_frequency": self.center_frequency,
@@ -331,16 +411,28 @@ class KeysightESA(visadevice.VisaDevice):
         }
 
         if return_complex:
-            c_data = i_data + 1j * q_data
+            if raw_data.dtype == np.float64 and raw_data.flags.c_contiguous:
+                # (I, Q) float64 pairs have exactly the memory layout of complex128, so reinterpret rather than compute
+                # note that this shares memory with metadata['raw_data']
+                c_data = raw_data.view(np.complex128)
+            else:
+                # fill the real and imaginary parts directly, this skips the temporaries of I + 1j*Q
+                c_data = np.empty(len(iq_pairs), dtype=np.complex128)
+                c_data.real = iq_pairs[:, 0]
+                c_data.imag = iq_pairs[:, 1]
             data_obj = pylabframe.data.NumericalData(c_data, x_axis=time_axis, axes_names=['time'], metadata=metadata)
         else:
-            data_obj = pylabframe.data.NumericalData([i_data, q_data, envelope_data], transpose=True, x_axis=time_axis, y_axis=['i', 'q', 'log_envelope'], axes_names=['time', 'quadrature'], metadata=metadata)
+            iqe_data = np.empty((len(iq_pairs), 3), dtype=np.float64)
+            iqe_data[:, :2] = iq_pairs
+            iqe_data[:, 2] = envelope_data
+            data_obj = pylabframe.data.NumericalData(iqe_data, x_axis=time_axis, y_axis=['i', 'q', 'log_envelope'], axes_names=['time', 'quadrature'], metadata=metadata)
 
         return data_obj
 
     ## COMPLETE MEASUREMENT FUNCTIONS
     # ===============================
 
+    @cache_reads
     def measure_spectrum(
             self, spectrum_center_freq, spectrum_span, points, avgs=100, rbw=None, vbw=None, average_mode=TraceAverageModes.RMS,
             esa_detector=DetectorModes.AVERAGE
@@ -363,22 +455,27 @@ class KeysightESA(visadevice.VisaDevice):
         :return: A :class:`~pylabframe.data.NumericalData` object holding the spectrum data, frequency axis (Hz) and metadata.
         """
         self.instrument_mode = self.InstrumentModes.SPECTRUM_ANALYZER
-        self.span = spectrum_span
-        self.center_frequency = spectrum_center_freq
-        self.trace_points = points
-        self.trace_average_mode = average_mode
-        self.trace_average_count = avgs
-        self.trace_averaging = True
-        self.detector = esa_detector
+
+        # send all settings in a single write (and check the instrument mode only once), rather than one by one
+        settings = dict(
+            span=spectrum_span,
+            center_frequency=spectrum_center_freq,
+            trace_points=points,
+            trace_average_mode=average_mode,
+            trace_average_count=avgs,
+            trace_averaging=True,
+            detector=esa_detector,
+        )
         if rbw is not None:
             if rbw is True:
-                self.rbw = spectrum_span / points
+                settings["rbw"] = spectrum_span / points
             else:
-                self.rbw = rbw
+                settings["rbw"] = rbw
         if vbw is not None:
             if vbw is True:
-                self.vbw = spectrum_span / points
+                settings["vbw"] = spectrum_span / points
             else:
-                self.vbw = vbw
+                settings["vbw"] = vbw
+        self.write_properties(**settings)
 
         return self.acquire_trace()
@@ -10,22 +10,26 @@ import pylabframe.data
 
 
 def to_onoff(value, none_is_off=False):
-    if value is not None:
-        if value:
-            return "ON"
-        else:
-            return "OFF"
-    if none_is_off:
-        return "OFF"
-    return None
+    if value is None:
+        return "OFF" if none_is_off else None
+    return "ON" if value else "OFF"
 
 
 def remove_units(val):
-    return float(val.rstrip(string.ascii_letters))
+    # most values come without units, for those a plain float() does the job
+    try:
+        return float(val)
+    except ValueError:
+        return float(val.rstrip(string.ascii_letters))
 
 
 def from_onoff(val):
-    return True if val == "ON" else False
+    return val == "ON"
+
+
+def from_load(val):
+    # high impedance is represented as False
+    return False if val == "HZ" else int(val)
 
 
 def str_or_none(val):
@@ -33,13 +37,8 @@ def str_or_none(val):
 
 
 def params_dict_to_str(params_dict):
-    params = []
-    for k, v in params_dict.items():
-        if v is not None:
-            params += [k, v]
-
-    params_str = ",".join(map(str, params))
-    return params_str
+    # parameters set to None are left out
+    return ",".join(f"{k},{v}" for k, v in params_dict.items() if v is not None)
 
 
 class SDG(visadevice.VisaDevice):
@@ -52,8 +51,8 @@ class SDG(visadevice.VisaDevice):
     WARNING: the frequencies as returned by the signal generator to SCPI queries have a lower precision than how they
     are displayed on the device screen and set internally. It seems that setting them via SCPI does work with the same precision
     """
-    def __init__(self, *args, read_termination='\n', write_termination='\n', **kwargs):
-        super().__init__(*args, read_termination=read_termination, write_termination=write_termination, **kwargs)
+    READ_TERMINATION = "\n"
+    WRITE_TERMINATION = "\n"
 
     class WaveTypes(SettingEnum):
         """Available waveforms.
@@ -147,6 +146,55 @@ class SDG(visadevice.VisaDevice):
         FALL = "FALL"
         OFF = "OFF"
 
+    # how to interpret the parameters in responses to BSWV? and BTWV? queries: SCPI key -> (parameter name, conversion)
+    # these don't change, so they're set up once here rather than on every query
+    _WAVE_PARAMS = {
+        "WVTP": ("wave_type", WaveTypes),
+        "FRQ": ("freq", remove_units),
+        "PERI": ("period", remove_units),
+        "AMP": ("amplitude_Vpp", remove_units),
+        "OFST": ("offset", remove_units),
+        "SYM": ("ramp_symmetry", remove_units),
+        "DUTY": ("duty_cycle", remove_units),
+        "PHSE": ("phase", remove_units),
+        "STDEV": ("noise_stddev", remove_units),
+        "MEAN": ("noise_mean", remove_units),
+        "WIDTH": ("width", remove_units),
+        "RISE": ("rise_time", remove_units),
+        "FALL": ("fall_time", remove_units),
+        "DLY": ("delay", remove_units),
+        "HLEV": ("high_level", remove_units),
+        "LLEV": ("low_level", remove_units),
+        "BANDSTATE": ("noise_band_filter", from_onoff),
+        "BANDWIDTH": ("noise_bandwidth", remove_units),
+        "AMPVRMS": ("amplitude_Vrms", remove_units),
+        "AMPDBM": ("amplitude_dBm", remove_units),
+        "MAX_OUTPUT_AMP": ("max_output_amplitude", remove_units)
+    }
+
+    # same for OUTP? responses, which contain both bare flags and keys followed by a value
+    _OUTPUT_FLAGS = {
+        "ON": ("on", True),
+        "OFF": ("on", False),
+    }
+
+    _OUTPUT_PARAMS = {
+        "LOAD": ("load", from_load),
+        "PLRT": ("invert_polarity", {"INVT": True, "NOR": False}.get),
+    }
+
+    _BURST_PARAMS = {
+        "STATE": ("state", from_onoff),
+        "PRD": ("burst_period", remove_units),
+        "STPS": ("start_phase", remove_units),
+        "GATE_NCYC": ("burst_mode", BurstModes),
+        "TRSR": ("trigger_source", TriggerSources),
+        "DLAY": ("burst_delay", remove_units),
+        "PLRT": ("gate_polarity", Polarities),
+        "TRMD": ("trigger_mode", TriggerModes),
+        "EDGE": ("trigger_edge", TriggerModes)
+    }
+
     def set_output(self, ch, on=None, load=None, invert_polarity=None):
         """Configure output channel settings.
 
@@ -190,25 +238,15 @@ class SDG(visadevice.VisaDevice):
             "invert_polarity": None
         }
 
-        # process the returned string piece by piece
-        while len(res) > 0:
-            next = res.pop(0)
-            if next == "ON":
-                state["on"] = True
-            elif next == "OFF":
-                state["on"] = False
-            elif next == "LOAD":
-                load = res.pop(0)
-                if load == "HZ":
-                    state["load"] = False
-                else:
-                    state["load"] = int(load)
-            elif next == "PLRT":
-                plrt = res.pop(0)
-                if plrt == "INVT":
-                    state["invert_polarity"] = True
-                elif plrt == "NOR":
-                    state["invert_polarity"] = False
+        # process the returned string piece by piece. keywords that come with a value take it from the same iterator
+        res_iter = iter(res)
+        for token in res_iter:
+            if token in self._OUTPUT_FLAGS:
+                param_name, val = self._OUTPUT_FLAGS[token]
+                state[param_name] = val
+            elif token in self._OUTPUT_PARAMS:
+                param_name, conv_func = self._OUTPUT_PARAMS[token]
+                state[param_name] = conv_func(next(res_iter))
             else:
                 # for now, we ignore parameters that we don't understand
                 pass
@@ -290,38 +328,16 @@ class SDG(visadevice.VisaDevice):
 
     @classmethod
     def _interpret_wave_params(cls, res_str):
-        params_dict = {
-            "WVTP": ("wave_type", cls.WaveTypes),
-            "FRQ": ("freq", remove_units),
-            "PERI": ("period", remove_units),
-            "AMP": ("amplitude_Vpp", remove_units),
-            "OFST": ("offset", remove_units),
-            "SYM": ("ramp_symmetry", remove_units),
-            "DUTY": ("duty_cycle", remove_units),
-            "PHSE": ("phase", remove_units),
-            "STDEV": ("noise_stddev", remove_units),
-            "MEAN": ("noise_mean", remove_units),
-            "WIDTH": ("width", remove_units),
-            "RISE": ("rise_time", remove_units),
-            "FALL": ("fall_time", remove_units),
-            "DLY": ("delay", remove_units),
-            "HLEV": ("high_level", remove_units),
-            "LLEV": ("low_level", remove_units),
-            "BANDSTATE": ("noise_band_filter", from_onoff),
-            "BANDWIDTH": ("noise_bandwidth", remove_units),
-            "AMPVRMS": ("amplitude_Vrms", remove_units),
-            "AMPDBM": ("amplitude_dBm", remove_units),
-            "MAX_OUTPUT_AMP": ("max_output_amplitude", remove_units)
-        }
+        params_dict = cls._WAVE_PARAMS
 
         res = res_str.split(" ")[-1]
         res = res.split(",")
 
         wave_params = {}
 
-        while len(res) > 0:
-            key = res.pop(0)
-            val = res.pop(0)
+        # the response alternates between keys and values
+        res_iter = iter(res)
+        for key, val in zip(res_iter, res_iter):
 
             # apply specified conversion function
             if key in params_dict:
@@ -412,17 +428,7 @@ class SDG(visadevice.VisaDevice):
         :return: A :external:class:`dict` that holds the output burst waveform configuration.
                  Items correspond to the parameters of :meth:`set_burst`.
         """
-        params_dict = {
-            "STATE": ("state", from_onoff),
-            "PRD": ("burst_period", remove_units),
-            "STPS": ("start_phase", remove_units),
-            "GATE_NCYC": ("burst_mode", self.BurstModes),
-            "TRSR": ("trigger_source", self.TriggerSources),
-            "DLAY": ("burst_delay", remove_units),
-            "PLRT": ("gate_polarity", self.Polarities),
-            "TRMD": ("trigger_mode", self.TriggerModes),
-            "EDGE": ("trigger_edge", self.TriggerModes)
-        }
+        params_dict = self._BURST_PARAMS
 
         res_str = self.instr.query(f"C{ch}:BTWV?")
 
@@ -431,17 +437,17 @@ class SDG(visadevice.VisaDevice):
 
         burst_params = {}
 
-        while len(res) > 0:
-            key = res.pop(0)
-            val = res.pop(0)
+        # the response alternates between keys and values
+        res_iter = iter(res)
+        for key, val in zip(res_iter, res_iter):
 
             # apply specified conversion function
             if key in params_dict:
                 param_name, conv_func = params_dict[key]
                 burst_params[param_name] = conv_func(val)
             elif key == 'CARR':
-                carrier_str = ",".join([val] + res)
+                # the carrier wave parameters make up the rest of the response
+                carrier_str = ",".join([val, *res_iter])
                 burst_params["carrier_wave"] = self._interpret_wave_params(carrier_str)
-                res = []
 
         return burst_params
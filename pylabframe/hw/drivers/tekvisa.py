@@ -1,5 +1,4 @@
 """Device drivers to control Tektronix equipment."""
-import os.path
 
 import numpy as np
 from enum import Enum
@@ -9,18 +8,42 @@ from pylabframe.hw.device import str_conv, SettingEnum, intbool_conv
 from pylabframe.hw.visadevice import visa_property, visa_command, visa_query
 import pylabframe.data
 
+# numba is optional: if it's available, the conversion of waveforms to physical units is compiled
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _levels_to_physical_kernel(wfm_raw, y_offset_levels, y_multiplier, y_zero, out):
+    # (level - offset) * multiplier + zero, in a single pass over the waveform
+    for i in range(wfm_raw.size):
+        out[i] = (wfm_raw[i] - y_offset_levels) * y_multiplier + y_zero
+    return out
+
+
+if numba is not None:
+    _levels_to_physical_kernel = numba.njit(cache=True, fastmath=True)(_levels_to_physical_kernel)
+else:
+    # the pure-python loop would be much slower than plain numpy, so don't use it
+    _levels_to_physical_kernel = None
+
 
 class TektronixScope(visadevice.VisaDevice):
     """Device driver for Tektronix oscilloscopes.
 
     Tested with: DPO3034, MSO64"""
     NUM_CHANNELS = 2
+    # waveforms of up to several MB are transferred as binary blocks, read those in larger pieces than pyvisa's default
+    # of 20 kB
+    CHUNK_SIZE = 1024*1024
 
     DEFAULT_SETTINGS = {
         "trace_data_encoding": "ribinary",
         "trace_data_width": 2,
         "math_data_encoding": "fpbinary",
         "math_data_width": 4,
+        "waveform_dtype": "float64",
     }
     """"""
 
@@ -109,6 +132,31 @@ class TektronixScope(visadevice.VisaDevice):
         wfm = self.do_waveform_transfer(math_channel=math_channel)
         return wfm
 
+    def acquire_channel_waveforms(self, channel_ids, start=1, stop=None, math_channel=False):
+        """Transfer the waveform data of several channels to PC.
+
+        Between the channels, only the data source is changed on the instrument, and the time axis is only computed
+        once (each data object gets its own copy, unless :attr:`~pylabframe.hw.device.Device.SHARE_AXES` is set).
+
+        :param channel_ids: Indices of the channels to be transferred
+        :param start: First data point to transfer, defaults to 1.
+        :type start: int, optional
+        :param stop: Last data point to transfer, defaults to the waveform end.
+        :type stop: int or None, optional
+        :param bool math_channel: If True, transfer channels MATH<#> rather than voltage channels CH<#>, defaults to `False`.
+        :return: A list of :class:`~pylabframe.data.NumericalData` objects, one per channel (see :meth:`acquire_channel_waveform`).
+        """
+        if stop is None:
+            # look up the waveform end once, rather than for every channel
+            stop = self.trace_points
+        return [self.acquire_channel_waveform(channel_id, start=start, stop=stop, math_channel=math_channel)
+                for channel_id in channel_ids]
+
+
+    # waveform transfer setup that was last sent to the instrument, None if unknown
+    _last_transfer_setup = None
+    # (settings, axis) of the last time axis, see _time_axis
+    _time_axis_cache = None
 
     def initialize_waveform_transfer(self, channel_id, start=1, stop=None, math_channel=False, encoding=None, data_width=None):
         """Set up the instrument for waveform transfer. Usually no need to call directly -- is called automatically by :meth:`acquire_channel_waveform`
@@ -124,25 +172,34 @@ class TektronixScope(visadevice.VisaDevice):
         :param data_width: Data width in bytes (see Tektronix manual entry for ``data:width`` SCPI command), default taken from :attr:`DEFAULT_SETTINGS`
         :type data_width: int or None, optional
         """
-        if not math_channel:
-            self.instr.write(f"data:source ch{channel_id}")
-        else:
-            self.instr.write(f"data:source math{channel_id}")
-        self.instr.write(f"data:start {start}")
         if stop is None:
             # default to full waveform
             stop = self.trace_points
-        self.instr.write(f"data:stop {stop}")
 
         if encoding is None:
             encoding = self.settings['trace_data_encoding'] if not math_channel else self.settings['math_data_encoding']
         if data_width is None:
             data_width = self.settings['trace_data_width'] if not math_channel else self.settings['math_data_width']
 
-        self.instr.write(f"data:encdg {encoding}")
-        self.instr.write(f"data:width {data_width}")
-
-        self.instr.write("header 0")
+        cmds = [
+            f"data:source ch{channel_id}" if not math_channel else f"data:source math{channel_id}",
+            f"data:start {start}",
+            f"data:stop {stop}",
+            f"data:encdg {encoding}",
+            f"data:width {data_width}",
+            "header 0",
+        ]
+        # only send the settings that changed since the last transfer, in one go
+        last_cmds = self._last_transfer_setup or [None] * len(cmds)
+        changed_cmds = [cmd for cmd, last_cmd in zip(cmds, last_cmds) if cmd != last_cmd]
+        if changed_cmds:
+            self.write_batch(changed_cmds)
+        self._last_transfer_setup = cmds
+
+    def invalidate_cache(self):
+        # a reset (or changes on the front panel) can also change the transfer setup, so it has to be sent again
+        super().invalidate_cache()
+        self._last_transfer_setup = None
 
     def do_waveform_transfer(self, math_channel=False):
         """Do the waveform data transfer and convert to the right units. Usually no need to call directly -- is called automatically by :meth:`acquire_channel_waveform`
@@ -151,22 +208,53 @@ class TektronixScope(visadevice.VisaDevice):
         :return: A :class:`~pylabframe.data.NumericalData` object holding the waveform data, time axis (s) and metadata.
         """
         if not math_channel:
-            wfm_raw = self.instr.query_binary_values("curve?", datatype='h', is_big_endian=True, container=np.array)
+            wfm_raw = self.query_binary_array("curve?", datatype='h', is_big_endian=True)
         else:
-            wfm_raw = self.instr.query_binary_values("curve?", datatype="f", is_big_endian=True, container=np.array)
-
-        wfm_converted = ((wfm_raw - self.waveform_y_offset_levels) * self.waveform_y_multiplier) + self.waveform_y_zero
-        x_axis = (np.arange(self.waveform_points) * self.waveform_x_increment) + self.waveform_x_zero
+            wfm_raw = self.query_binary_array("curve?", datatype="f", is_big_endian=True)
+
+        # get the whole waveform preamble in a single round trip
+        preamble = self.read_properties([
+            "waveform_points", "waveform_y_multiplier", "waveform_y_offset_levels", "waveform_y_zero", "waveform_y_unit",
+            "waveform_x_increment", "waveform_x_zero", "waveform_x_unit",
+        ])
+
+        # convert to physical units in a single array, rather than allocating a temporary for every operation.
+        # (this array is handed out with the data object, so it can't be a buffer that is reused between transfers)
+        # the raw levels have at most 16 bits, so setting waveform_dtype to float32 loses no precision and halves the size
+        wfm_dtype = np.dtype(self.settings["waveform_dtype"])
+        if _levels_to_physical_kernel is not None:
+            wfm_converted = _levels_to_physical_kernel(wfm_raw, preamble["waveform_y_offset_levels"],
+                                                       preamble["waveform_y_multiplier"], preamble["waveform_y_zero"],
+                                                       np.empty(wfm_raw.size, dtype=wfm_dtype))
+        else:
+            wfm_converted = np.subtract(wfm_raw, preamble["waveform_y_offset_levels"], dtype=wfm_dtype)
+            wfm_converted *= preamble["waveform_y_multiplier"]
+            wfm_converted += preamble["waveform_y_zero"]
+        x_axis = self._time_axis(preamble["waveform_points"], preamble["waveform_x_increment"], preamble["waveform_x_zero"])
 
         metadata = {
-            "x_unit": self.waveform_x_unit,
+            "x_unit": preamble["waveform_x_unit"],
             "x_label": f"time",
-            "y_unit": self.waveform_y_unit,
+            "y_unit": preamble["waveform_y_unit"],
             "y_label": f"signal",
         }
         data_obj = pylabframe.data.NumericalData(wfm_converted, x_axis=x_axis, metadata=metadata)
         return data_obj
 
+    def _time_axis(self, points, x_increment, x_zero):
+        # the time axis usually doesn't change between acquisitions, so reuse the last one if the settings match.
+        # unless the device shares its axes (see Device.SHARE_AXES), every data object gets a (writeable) copy of it
+        dtype = self.x_axis_dtype
+        key = (points, x_increment, x_zero, dtype)
+        if self._time_axis_cache is None or self._time_axis_cache[0] != key:
+            x_axis = np.arange(points, dtype=dtype)
+            x_axis *= x_increment
+            x_axis += x_zero
+            x_axis.flags.writeable = False
+            self._time_axis_cache = (key, x_axis)
+        x_axis = self._time_axis_cache[1]
+        return x_axis if self.share_axes else x_axis.copy()
+
     # channel properties
     class Channel:
         def __init__(self, channel, device):
@@ -174,6 +262,9 @@ class TektronixScope(visadevice.VisaDevice):
             self.query_params = {'channel_id':  channel}
             self.device: "TektronixScope" = device
             self.instr = self.device.instr
+            # the channel properties share their options and cached values with the device
+            self.command_options = self.device.command_options
+            self.property_cache = self.device.property_cache
 
         y_scale = visa_property("ch{channel_id}:scale", rw_conv=float)
         offset = visa_property("ch{channel_id}:offset", rw_conv=float)
@@ -206,15 +297,23 @@ class TektronixScope(visadevice.VisaDevice):
     :return: A :external:class:`bytes` object containing the binary file contents.
     """
 
-    def save_file_content(self, source_file_name, dest_file_name, dest_exist_ok=False):
+    def save_file_content(self, source_file_name, dest_file_name, dest_exist_ok=False, chunk_size=64*1024):
         """Transfer a file from the oscilloscope file system and save it to a file on the PC.
 
         :param str source_file_name: File name on the oscilloscope file system.
         :param str dest_file_name: Destination file name on the PC. Used as-is, no further expanding done by :mod:`pylabframe.data.path`.
         :param bool dest_exist_ok: If False (default), raise :external:exc:`FileExistsError` if file already exists on PC. If True, overwrite the file.
+        :param int chunk_size: The file is written to disk in pieces of this many bytes as it comes in, rather than
+            being held in memory as a whole. Defaults to 64 kB.
         """
-        if not dest_exist_ok and os.path.exists(dest_file_name):
-            raise FileExistsError(dest_file_name)
-        with open(dest_file_name, "wb") as dest_f:
-            file_data = self.transfer_file_content(file_name=source_file_name)
-            dest_f.write(file_data)
+        # 'x' mode raises FileExistsError if the file is already there
+        with open(dest_file_name, "wb" if dest_exist_ok else "xb") as dest_f:
+            cmd = f'filesystem:readfile "{source_file_name}"'
+            self.instr.write(cmd)
+            n_bytes = self._read_block_length(cmd)
+            while n_bytes > 0:
+                chunk = self.instr.read_bytes(min(chunk_size, n_bytes))
+                dest_f.write(chunk)
+                n_bytes -= len(chunk)
+            # clear the termination from the buffer
+            self.instr.read_bytes(len(self.instr.read_termination or ""))
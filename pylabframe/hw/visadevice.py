@@ -9,13 +9,31 @@ This module builds on top of the `PyVISA`_ package.
 
 import time
 import string
+import functools
+import contextlib
 
+import numpy as np
 import pyvisa
 from . import device
 
 from enum import Enum, IntEnum
 
-_visa_rm = pyvisa.ResourceManager()
+# creating the resource manager loads the VISA backend, which is slow. so only do that once a device is actually used
+_visa_rm = None
+
+
+def _get_resource_manager():
+    global _visa_rm
+    if _visa_rm is None:
+        _visa_rm = pyvisa.ResourceManager()
+    return _visa_rm
+
+
+# listing the available resources scans all VISA interfaces, which can take seconds. so we keep the result around for a
+# little while. entries are (time of listing, resources)
+_resource_list_cache = None
+RESOURCE_LIST_TTL = 10.0
+"""Time (s) for which :meth:`VisaDevice.list_available` returns the previously found resources."""
 
 
 class EventStatusRegister:
@@ -29,6 +47,10 @@ class EventStatusRegister:
         URQ = 6
         PON = 7
     ERROR_MASK = 0b00111100
+    # names of bits 0..7, so __repr__ doesn't have to go through the enum for every bit
+    _BIT_NAMES = tuple(f.name for f in Functions)
+
+    __slots__ = ("esr",)
 
     def __init__(self, val):
         self.esr = int(val)
@@ -57,23 +79,218 @@ class EventStatusRegister:
         return self.function_value(self.Functions.QYE)
 
     def __repr__(self):
-        bits_set = []
-        for i in range(8):
-            if self.function_value(i):
-                bits_set.append(self.Functions(i))
-
-        bits_set = [b.name for b in bits_set]
+        bits_set = [name for i, name in enumerate(self._BIT_NAMES) if self.esr & (1 << i)]
         return f"EventStatusRegister([{', '.join(bits_set)}])"
 
 
+_WHITESPACE_TOLERANT_CONVS = {int, float, device.intbool_conv}
+
+
+class VisaProperty(property):
+    """The property type returned by :func:`visa_property`.
+
+    Besides acting as a normal property, it exposes how the device parameter is queried, such that several of them
+    can be read out with a single compound query (see :meth:`VisaDevice.read_properties`)."""
+
+    def __init__(self, visa_cmd, read_conv=str, write_conv=str, read_only=False, access_guard=None, read_suffix="?",
+                 read_on_write=False, set_cmd_delimiter=" ", cache=False, dtype=None, on_write=None):
+        self.visa_cmd = visa_cmd
+        self.read_conv = read_conv
+        self.write_conv = write_conv
+        self.read_only = read_only
+        self.access_guard = access_guard
+        self.read_suffix = read_suffix
+        self.read_on_write = read_on_write
+        self.set_cmd_delimiter = set_cmd_delimiter
+        self.cache = cache
+        self.on_write = on_write
+        # int() and float() ignore surrounding whitespace themselves, so their responses don't need to be stripped first
+        self.strip_response = read_conv not in _WHITESPACE_TOLERANT_CONVS
+        # we end the command with a configurable suffix, usually ? for SCPI settings
+        self.fixed_query = f"{visa_cmd}{read_suffix}"
+        # when writing, we squeeze in a configurable delimiter (default is space) before the value
+        self.write_prefix = f"{visa_cmd}{set_cmd_delimiter}"
+
+        # attribute access goes through __get__ and __set__ below, fget and fset are only there for introspection
+        # (e.g. sphinx picks up the return type from fget)
+        def fget(device: "VisaDevice"):
+            return self.read(device)
+        if dtype is not None:
+            fget.__annotations__['return'] = dtype
+
+        fset = None
+        if not read_only:
+            def fset(device: "VisaDevice", value):
+                self.write(device, value)
+
+        super().__init__(fget, fset)
+
+    def __get__(self, device, owner=None):
+        if device is None:
+            return self
+
+        # this is the hot path for reading out settings, so it's read() with the literal query and parse_response()
+        # inlined, rather than two extra method calls. keep them in sync
+        cache = device.property_cache
+        caching = self.cache or cache.scope_depth
+        if caching and self.fixed_query in cache:
+            return cache[self.fixed_query]
+
+        if self.access_guard is not None:
+            self.access_guard(device)
+
+        response = device.instr.query(self.fixed_query)
+        response = self.read_conv(response.strip() if self.strip_response else response)
+
+        # apply configurable transformations
+        options = device.command_options.get(self)
+        if options:
+            response = visa_read_value_transform(response, **options)
+
+        if caching:
+            cache.store(self.fixed_query, response, self.cache)
+        return response
+
+    def __set__(self, device, value):
+        if self.read_only:
+            raise AttributeError("This device property is read-only.")
+        # literal commands don't need formatting, so skip format_cmd() altogether
+        self._write(device, self.write_prefix, self.fixed_query, value)
+
+    def format_cmd(self, device: "VisaDevice") -> str:
+        return self.visa_cmd
+
+    def build_query(self, device: "VisaDevice") -> str:
+        return self.fixed_query
+
+    def parse_response(self, device: "VisaDevice", response: str):
+        response = self.read_conv(response.strip() if self.strip_response else response)
+
+        # apply configurable transformations
+        options = device.command_options.get(self)
+        if options:
+            response = visa_read_value_transform(response, **options)
+
+        return response
+
+    def read(self, device: "VisaDevice"):
+        query = self.build_query(device)
+        cache = device.property_cache
+        caching = self.cache or cache.scope_depth
+        if caching and query in cache:
+            return cache[query]
+
+        if self.access_guard is not None:
+            self.access_guard(device)
+
+        response = self.parse_response(device, device.instr.query(query))
+        if caching:
+            cache.store(query, response, self.cache)
+        return response
+
+    def encode_value(self, device: "VisaDevice", value) -> str:
+        # apply configurable transformations
+        options = device.command_options.get(self)
+        if options:
+            if options.get("disable_write", False):
+                raise ValueError("Writing to this device property has been disabled in your config.")
+            value = visa_write_value_transform(value, **options)
+
+        return self.write_conv(value)
+
+    def write(self, device: "VisaDevice", value):
+        fmt_visa_cmd = self.format_cmd(device)
+        self._write(device, f"{fmt_visa_cmd}{self.set_cmd_delimiter}", f"{fmt_visa_cmd}{self.read_suffix}", value)
+
+    def build_write_command(self, device: "VisaDevice", value, check_access=True) -> str:
+        """Return the command that sets this parameter to ``value``, without sending it (see
+        :meth:`VisaDevice.write_properties`). The cached value is dropped all the same.
+
+        :param check_access: If False, the access guard is not run, e.g. because the caller already did."""
+        if self.read_only:
+            raise AttributeError("This device property is read-only.")
+        fmt_visa_cmd = self.format_cmd(device)
+        return self._build_write_command(device, f"{fmt_visa_cmd}{self.set_cmd_delimiter}",
+                                         f"{fmt_visa_cmd}{self.read_suffix}", value, check_access=check_access)
+
+    def _build_write_command(self, device: "VisaDevice", write_prefix, query, value, check_access=True):
+        if check_access and self.access_guard is not None:
+            self.access_guard(device)
+
+        # the cache is keyed by the query, so that templated commands are cached per e.g. channel
+        device.property_cache.pop(query, None)
+
+        cmd = f"{write_prefix}{self.encode_value(device, value)}"
+        if self.on_write is not None:
+            self.on_write(device)
+        return cmd
+
+    def _write(self, device: "VisaDevice", write_prefix, query, value):
+        cmd = self._build_write_command(device, write_prefix, query, value)
+        if not self.read_on_write:
+            device.instr.write(cmd)
+        else:
+            # some devices return a value upon setting, optionally read that out to clear the buffer
+            # we discard the response, nothing we can do with it here
+            device.instr.query(cmd)
+
+
+class TemplatedVisaProperty(VisaProperty):
+    """A :class:`VisaProperty` whose command contains {placeholders}, which are filled in from the device's
+    ``query_params`` (e.g. a channel id) on every access."""
+
+    def format_cmd(self, device: "VisaDevice") -> str:
+        if hasattr(device, "query_params"):
+            # doing this gives us access to object properties (eg channel id) that can be put in the command string
+            return self.visa_cmd.format_map(device.query_params)
+        return self.visa_cmd
+
+    def build_query(self, device: "VisaDevice") -> str:
+        return f"{self.format_cmd(device)}{self.read_suffix}"
+
+    def __get__(self, device, owner=None):
+        if device is None:
+            return self
+        return self.read(device)
+
+    def __set__(self, device, value):
+        if self.read_only:
+            raise AttributeError("This device property is read-only.")
+        self.write(device, value)
+
+
 DTYPE_CONVERTERS = {
     bool: (device.intbool_conv, int),
 }
 
 
+def _setting_enum_conv(enum_cls):
+    # calling enum_cls(value) goes through the whole enum machinery. look the member up by value directly instead, and
+    # only fall back on that for unknown values (for its error message, or any custom _missing_ handling)
+    members_by_value = enum_cls._value2member_map_
+
+    def conv(value):
+        member = members_by_value.get(value)
+        return member if member is not None else enum_cls(value)
+
+    return conv
+
+
+def _setting_enum_write_conv(enum_cls):
+    # the command strings of all members are known up front, so writing is a dict lookup rather than a call to
+    # SettingEnum.__str__. anything else (e.g. a raw command string) is converted with str() as before
+    strings_by_member = {m: str(m) for m in enum_cls}
+
+    def conv(value):
+        s = strings_by_member.get(value)
+        return s if s is not None else str(value)
+
+    return conv
+
+
 def visa_property(visa_cmd: str, dtype=None, read_only=False, read_conv=str, write_conv=str, rw_conv=None,
-                  access_guard=None, read_suffix="?", read_on_write=False, set_cmd_delimiter=" ",
-                  ):
+                  access_guard=None, read_suffix="?", read_on_write=False, set_cmd_delimiter=" ", cache=False,
+                  on_write=None):
     """Defines a property that reads out or sets a device parameter. Must be used within a :class:`VisaDevice`.
 
     For every access of the property, the command specified in ``visa_cmd`` is sent to the device. If it's a read access,
@@ -106,6 +323,8 @@ def visa_property(visa_cmd: str, dtype=None, read_only=False, read_conv=str, wri
     :param read_suffix: This suffix is appended to the ``visa_cmd`` in case of a read access. Defaults to ``?`` as is common for SCPI commands.
     :param read_on_write: If True, a VISA read is issued even after a write access. Some devices return a value upon setting, this allows to clear out the buffer. The response is discarded.
     :param set_cmd_delimiter: Delimiter between ``visa_cmd`` and the value to be set. Defaults to :literal:`\ ` (blank space).
+    :param cache: If True, the value is only queried from the device on the first read, later reads return the stored value. Writing to the property through pylabframe invalidates the stored value, but changes made in any other way (e.g. on the front panel or by a reset command) are not picked up -- call :meth:`VisaDevice.invalidate_cache` in that case. Only use this for settings that rarely change.
+    :param on_write: If specified, this function is called with the device whenever the parameter is set. Can be used to invalidate state that depends on the parameter.
     :return:
     """
     if rw_conv is not None:
@@ -118,68 +337,15 @@ def visa_property(visa_cmd: str, dtype=None, read_only=False, read_conv=str, wri
         else:
             read_conv, write_conv = dtype, dtype
             if issubclass(dtype, device.SettingEnum):
-                write_conv = str
-
-    # we use this dict to pass the property object into the getter/setter functions
-    # such that these functions can look up their options in self.command_options
-    property_info = {}
+                read_conv = _setting_enum_conv(dtype)
+                write_conv = _setting_enum_write_conv(dtype)
 
-    def visa_getter(self: "VisaDevice"):
-        if access_guard is not None:
-            access_guard(self)
+    # most commands don't contain any {placeholders}, for those we don't need to format anything on every access
+    prop_class = TemplatedVisaProperty if "{" in visa_cmd else VisaProperty
 
-        fmt_visa_cmd = visa_cmd
-        if hasattr(self, "query_params"):
-            # doing this gives us access to object properties (eg channel id) that can be put in the command string
-            fmt_visa_cmd = fmt_visa_cmd.format(**self.query_params)
-        # we end the command with a configurable suffix, usually ? for SCPI settings
-        response = self.instr.query(f"{fmt_visa_cmd}{read_suffix}")
-        response = read_conv(response.strip())
-
-        # apply configurable transformations
-        this_prop = property_info['property_object']
-        if this_prop in self.command_options:
-            response = visa_read_value_transform(response, **self.command_options[this_prop])
-
-        return response
-
-    # set type hint so that it is picked up by Sphinx for documentation
-    if dtype is not None:
-        visa_getter.__annotations__['return'] = dtype
-
-    if not read_only:
-        def visa_setter(self: "VisaDevice", value):
-            if access_guard is not None:
-                access_guard(self)
-
-            fmt_visa_cmd = visa_cmd
-            if hasattr(self, "query_params"):
-                fmt_visa_cmd = fmt_visa_cmd.format(**self.query_params)
-
-            # apply configurable transformations
-            this_prop = property_info['property_object']
-            if this_prop in self.command_options:
-                if self.command_options[this_prop].get("disable_write", False):
-                    raise ValueError("Writing to this device property has been disabled in your config.")
-                value = visa_write_value_transform(value, **self.command_options[this_prop])
-
-            value = write_conv(value)
-
-            # we squeeze in a configurable delimiter (default is space)
-            cmd = f"{fmt_visa_cmd}{set_cmd_delimiter}{value}"
-            if not read_on_write:
-                self.instr.write(cmd)
-            else:
-                # some devices return a value upon setting, optionally read that out to clear the buffer
-                # we discard the response, nothing we can do with it here
-                self.instr.query(cmd)
-    else:
-        visa_setter = None
-
-    prop = property(visa_getter, visa_setter)
-    property_info['property_object'] = prop
-
-    return prop
+    return prop_class(visa_cmd, read_conv=read_conv, write_conv=write_conv, read_only=read_only,
+                      access_guard=access_guard, read_suffix=read_suffix, read_on_write=read_on_write,
+                      set_cmd_delimiter=set_cmd_delimiter, cache=cache, dtype=dtype, on_write=on_write)
 
 
 def visa_command(visa_cmd, wait_until_done=False, kwarg_defaults=None, wait_before=False, max_wait=False, read_on_write=False):
@@ -189,6 +355,8 @@ def visa_command(visa_cmd, wait_until_done=False, kwarg_defaults=None, wait_befo
     wait_before_default = wait_before
     max_wait_default = max_wait
     read_on_write_default = read_on_write
+    # most commands don't contain any {placeholders}, for those we don't need to format anything on every call
+    needs_format = "{" in visa_cmd
 
     def visa_executer(self: "VisaDevice", wait_until_done=None, wait_before=None, max_wait=None, read_on_write=None, **kw):
         if wait_until_done is None:
@@ -199,18 +367,21 @@ def visa_command(visa_cmd, wait_until_done=False, kwarg_defaults=None, wait_befo
             max_wait = max_wait_default
         if read_on_write is None:
             read_on_write = read_on_write_default
-        if hasattr(self, "query_params"):
-            kw.update(self.query_params)
+        if not needs_format:
+            fmt_visa_cmd = visa_cmd
+        else:
+            if hasattr(self, "query_params"):
+                kw.update(self.query_params)
 
-        kw_plus_defaults = {
-            **kwarg_defaults,
-            **kw
-        }
-        try:
-            fmt_visa_cmd = visa_cmd.format(**kw_plus_defaults)
-        except KeyError as e:
-            # TODO: raise an error as well for unused arguments (using string.Formatter & check_unused_args)
-            raise ValueError(f"Missing argument {e.args[0]} in VISA command '{visa_cmd}'")
+            kw_plus_defaults = {
+                **kwarg_defaults,
+                **kw
+            }
+            try:
+                fmt_visa_cmd = visa_cmd.format_map(kw_plus_defaults)
+            except KeyError as e:
+                # TODO: raise an error as well for unused arguments (using string.Formatter & check_unused_args)
+                raise ValueError(f"Missing argument {e.args[0]} in VISA command '{visa_cmd}'")
         if wait_before:
             fmt_visa_cmd = "*WAI;" + fmt_visa_cmd
         if wait_until_done:
@@ -226,27 +397,36 @@ def visa_command(visa_cmd, wait_until_done=False, kwarg_defaults=None, wait_befo
     return visa_executer
 
 
-def visa_query(visa_cmd, kwarg_defaults=None, binary=False, **query_kw):
+def visa_query(visa_cmd, kwarg_defaults=None, binary=False, datatype="s", is_big_endian=False, **query_kw):
+    # binary responses are returned as bytes for the default datatype 's'. for any other datatype they are parsed
+    # straight into a numpy array (see VisaDevice.query_binary_array), rather than going through bytes first
     if kwarg_defaults is None:
         kwarg_defaults = {}
+    needs_format = "{" in visa_cmd
+
     def visa_executer(self: "VisaDevice", **kw):
-        if hasattr(self, "query_params"):
-            kw.update(self.query_params)
+        if not needs_format:
+            fmt_visa_cmd = visa_cmd
+        else:
+            if hasattr(self, "query_params"):
+                kw.update(self.query_params)
 
-        kw_plus_defaults = {
-            **kwarg_defaults,
-            **kw
-        }
-        try:
-            fmt_visa_cmd = visa_cmd.format(**kw_plus_defaults)
-        except KeyError as e:
-            # TODO: raise an error as well for unused arguments (using string.Formatter & check_unused_args)
-            raise ValueError(f"Missing argument {e.args[0]} in VISA command '{visa_cmd}'")
+            kw_plus_defaults = {
+                **kwarg_defaults,
+                **kw
+            }
+            try:
+                fmt_visa_cmd = visa_cmd.format_map(kw_plus_defaults)
+            except KeyError as e:
+                # TODO: raise an error as well for unused arguments (using string.Formatter & check_unused_args)
+                raise ValueError(f"Missing argument {e.args[0]} in VISA command '{visa_cmd}'")
 
         if not binary:
             return self.instr.query(fmt_visa_cmd, **query_kw)
-        else:
+        elif datatype == "s":
             return self.instr.query_binary_values(fmt_visa_cmd, datatype='s', container=bytes, **query_kw)
+        else:
+            return self.query_binary_array(fmt_visa_cmd, datatype=datatype, is_big_endian=is_big_endian)
 
     return visa_executer
 
@@ -269,30 +449,122 @@ def visa_write_value_transform(val, value_multiplier=None, round_on_write_digits
     return val
 
 
+class _PropertyCache(dict):
+    # cached property values, keyed by their query. besides the values of properties defined with cache=True, it holds
+    # the values of all properties read within a cache_scope(), which are removed again when the scope ends
+    def __init__(self):
+        super().__init__()
+        self.scope_depth = 0
+        self.scoped_keys = set()
+
+    def store(self, key, value, persistent):
+        self[key] = value
+        if not persistent:
+            self.scoped_keys.add(key)
+
+    def end_scope(self):
+        for key in self.scoped_keys:
+            self.pop(key, None)
+        self.scoped_keys.clear()
+
+
+def cache_reads(func):
+    """Decorator for device methods, which caches all property reads for the duration of the call (see
+    :meth:`VisaDevice.cache_scope`)."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kw):
+        with self.cache_scope():
+            return func(self, *args, **kw)
+    return wrapper
+
+
+def _compound_command(cmds):
+    # a leading colon makes every command start from the root of the command tree, rather than from the
+    # branch of the previous one
+    return ";".join(c if c.startswith((":", "*")) else f":{c}" for c in cmds)
+
+
 class VisaDevice(device.Device):
-    def __init__(self, id, address, error_on_double_connect=True, settings=None, command_options=None, **kw):
+    BATCH_METADATA_QUERIES = False
+    """If True, the :class:`VisaProperty` metadata fields are read out with a single compound query, rather than one
+    query per field. Only enable this for devices that support SCPI compound queries."""
+
+    BATCH_WRITES = True
+    """If True, :meth:`write_batch` and :meth:`write_properties` send their commands as a single compound command. Set to False for devices that don't
+    accept SCPI compound commands, the commands are then written one by one."""
+
+    WAIT_WITH_SRQ = False
+    """If True, :meth:`wait_until_done` lets the device signal completion with a service request, rather than waiting
+    for the response to ``*OPC?``. Only enable this for devices (and VISA interfaces) that support service requests.
+    Note that this overwrites the device's service request enable (``*SRE``) and event status enable (``*ESE``)
+    registers."""
+
+    READ_TERMINATION = None
+    """Termination character(s) of the device's responses, e.g. ``"\\n"``. Setting it lets pyvisa detect the end of a
+    response right away. If None, pyvisa's default is used. Can be overridden per device with the ``read_termination``
+    keyword argument."""
+
+    WRITE_TERMINATION = None
+    """Termination character(s) appended to every command. If None, pyvisa's default is used. Can be overridden per
+    device with the ``write_termination`` keyword argument."""
+
+    CHUNK_SIZE = None
+    """Size (bytes) of the pieces in which pyvisa reads responses. Larger chunks speed up the transfer of large (binary)
+    responses, such as traces. If None, pyvisa's default (20 kB) is used. Can be overridden per device with the
+    ``chunk_size`` keyword argument."""
+
+    def __init__(self, id, address, error_on_double_connect=True, settings=None, command_options=None, chunk_size=None, **kw):
+        """Connect to a VISA device.
+
+        :param chunk_size: Size (bytes) of the pieces in which pyvisa reads responses. If None, :attr:`CHUNK_SIZE` is used.
+        :param kw: Other keyword arguments are passed on to :external:meth:`pyvisa.highlevel.ResourceManager.open_resource`, e.g. ``timeout`` or ``read_termination``.
+
+        For the other parameters, see :class:`~pylabframe.hw.device.Device`.
+        """
         super().__init__(id, error_on_double_connect=error_on_double_connect, settings=settings)
         self.address = address
-        self.instr: pyvisa.resources.messagebased.MessageBasedResource = _visa_rm.open_resource(address, **kw)
+        if chunk_size is None:
+            chunk_size = self.CHUNK_SIZE
+        if chunk_size is not None:
+            kw["chunk_size"] = chunk_size
+        if self.READ_TERMINATION is not None:
+            kw.setdefault("read_termination", self.READ_TERMINATION)
+        if self.WRITE_TERMINATION is not None:
+            kw.setdefault("write_termination", self.WRITE_TERMINATION)
+        self.instr: pyvisa.resources.messagebased.MessageBasedResource = _get_resource_manager().open_resource(address, **kw)
 
         # construct command options
         self.command_options = {}
+        # values of visa properties defined with cache=True, keyed by their query
+        self.property_cache = _PropertyCache()
         if command_options is not None:
             for k,v in command_options.items():
                 cmd_obj = self.look_up_command_object(k)
                 self.command_options[cmd_obj] = v
 
-    def __del__(self):
-        if self.instr:
+    def close(self):
+        """Close the VISA connection to the device."""
+        if getattr(self, "instr", None) is not None:
             self.instr.close()
-            del self.instr
+            self.instr = None
+        super().close()
+
+    def __del__(self):
+        self.close()
 
     def setup(self, *args, **kw):
         pass
 
     @classmethod
-    def list_available(cls):
-        return list(_visa_rm.list_resources())
+    def list_available(cls, refresh=False):
+        """List the available VISA resources.
+
+        :param refresh: If True, always scan for resources. Otherwise, a listing made less than :data:`RESOURCE_LIST_TTL` seconds ago is reused.
+        """
+        global _resource_list_cache
+        if refresh or _resource_list_cache is None or time.monotonic() - _resource_list_cache[0] > RESOURCE_LIST_TTL:
+            _resource_list_cache = (time.monotonic(), tuple(_get_resource_manager().list_resources()))
+        return list(_resource_list_cache[1])
 
     def get_identifier(self, sanitize=True):
         response = self.instr.query("*IDN?")
@@ -300,31 +572,297 @@ class VisaDevice(device.Device):
             response = response.strip()
         return response
 
+    async def aquery(self, visa_cmd):
+        """Send a query without blocking the :mod:`asyncio` event loop, such that queries to different devices overlap.
+
+        :param visa_cmd: The query to send, e.g. ``*IDN?``.
+        :return: The response string.
+        """
+        return await self.run_async(self.instr.query, visa_cmd)
+
     def wait_until_done(self, visa_cmd=None, max_wait=False):
+        if self.WAIT_WITH_SRQ:
+            return self._wait_for_srq(visa_cmd, max_wait=max_wait)
+
         if visa_cmd is not None:
             cmd_string = f"{visa_cmd};*OPC?"
         else:
             cmd_string = "*OPC?"
         start_time = time.perf_counter()
         self.instr.write(cmd_string)
-        is_done = False
-        while not is_done:
-            if max_wait is not False and time.perf_counter() - start_time > max_wait:
-                raise TimeoutError(f"Exceeded the maximum waiting time of {max_wait} s")
-            try:
-                result_code = self.instr.read()
-                is_done = True
-            except pyvisa.VisaIOError as e:
-                if e.error_code != pyvisa.constants.StatusCode.error_timeout:
-                    # re-raise anything other than a time-out
-                    raise e
-        return result_code
+
+        saved_timeout = self.instr.timeout
+        try:
+            while True:
+                if max_wait is not False:
+                    remaining_wait = max_wait - (time.perf_counter() - start_time)
+                    if remaining_wait <= 0:
+                        raise TimeoutError(f"Exceeded the maximum waiting time of {max_wait} s")
+                    # wait for the remaining time in a single read, rather than polling with the instrument's timeout
+                    self.instr.timeout = max(1, int(remaining_wait * 1e3))
+                try:
+                    return self.instr.read()
+                except pyvisa.VisaIOError as e:
+                    if e.error_code != pyvisa.constants.StatusCode.error_timeout:
+                        # re-raise anything other than a time-out
+                        raise e
+        finally:
+            self.instr.timeout = saved_timeout
+
+    def _wait_for_srq(self, visa_cmd=None, max_wait=False):
+        # let operation complete (bit 0 of the event status register) raise the event status bit (bit 5) of the status
+        # byte, which in turn requests service. then we can just sleep until the VISA library hands us the event
+        self.instr.write("*ESE 1;*SRE 32")
+        event_type = pyvisa.constants.EventType.service_request
+        self.instr.enable_event(event_type, pyvisa.constants.EventMechanism.queue)
+
+        start_time = time.perf_counter()
+        try:
+            self.instr.write(f"{visa_cmd};*OPC" if visa_cmd is not None else "*OPC")
+            while True:
+                if max_wait is not False:
+                    remaining_wait = max_wait - (time.perf_counter() - start_time)
+                    if remaining_wait <= 0:
+                        raise TimeoutError(f"Exceeded the maximum waiting time of {max_wait} s")
+                    timeout = max(1, int(remaining_wait * 1e3))
+                else:
+                    # wait in steps of the instrument's timeout, such that the wait can still be interrupted
+                    timeout = self.instr.timeout
+                response = self.instr.wait_on_event(event_type, timeout, capture_timeout=True)
+                if not response.timed_out and self.instr.read_stb() & 0b00100000:
+                    # reading out the event status register clears it for the next wait
+                    return self.instr.query("*ESR?")
+        finally:
+            self.instr.disable_event(event_type, pyvisa.constants.EventMechanism.queue)
+            self.instr.discard_events(event_type, pyvisa.constants.EventMechanism.queue)
+
+    def query_binary_array(self, visa_cmd, datatype="d", is_big_endian=True) -> np.ndarray:
+        """Query a binary block of data and return it as a numpy array in native byte order.
+
+        :param visa_cmd: The query to send, e.g. ``curve?``.
+        :param datatype: Data type of a single element, in :mod:`struct` notation.
+        :param is_big_endian: Byte order in which the instrument sends the data.
+        """
+        raw_data = self.instr.query_binary_values(visa_cmd, datatype=datatype, is_big_endian=is_big_endian,
+                                                  container=np.array)
+        # pyvisa wraps the received bytes as-is, so the array is still in the instrument's byte order. swap it to native
+        # order once here, otherwise every operation on the data has to do the byteswap again
+        return raw_data.astype(raw_data.dtype.newbyteorder("="), copy=False)
+
+    def query_binary_arrays(self, visa_cmds, datatype="d", is_big_endian=True) -> list:
+        """Query several binary blocks of data with a single compound query, and return them as numpy arrays in native
+        byte order.
+
+        The received blocks are copied once, so this is meant for smaller blocks -- use :meth:`query_binary_array` for
+        large ones.
+
+        :param visa_cmds: The queries to send, e.g. ``["fetch:waveform1?", "fetch:waveform2?"]``.
+        :param datatype: Data type of a single element, in :mod:`struct` notation.
+        :param is_big_endian: Byte order in which the instrument sends the data.
+        """
+        dtype = np.dtype(datatype).newbyteorder(">" if is_big_endian else "<")
+        self.instr.write(_compound_command(visa_cmds))
+
+        arrays = []
+        for i in range(len(visa_cmds)):
+            n_bytes = self._read_block_length(visa_cmds[i])
+            raw_data = np.frombuffer(bytearray(self.instr.read_bytes(n_bytes)), dtype=dtype)
+            arrays.append(raw_data.astype(dtype.newbyteorder("="), copy=False))
+            # skip the ; between the responses, or the termination after the last one
+            self.instr.read_bytes(1 if i < len(visa_cmds) - 1 else len(self.instr.read_termination or ""))
+
+        return arrays
+
+    def write_batch(self, cmds):
+        """Send multiple commands as a single compound command (see :attr:`BATCH_WRITES`).
+
+        :param cmds: List of complete commands, e.g. ``["data:start 1", "data:stop 1000"]``.
+        """
+        if self.BATCH_WRITES:
+            self.instr.write(_compound_command(cmds))
+        else:
+            for cmd in cmds:
+                self.instr.write(cmd)
+
+    def _read_block_length(self, visa_cmd):
+        # reads the header of a binary block response and returns the length of the data that follows it.
+        # the header is #, the number of digits of the block length, and the length itself (in bytes)
+        header = self.instr.read_bytes(2)
+        if header[:1] != b"#" or header[1:] == b"0":
+            raise RuntimeError(f"Expected a definite length binary block in response to '{visa_cmd}', got {header}")
+        return int(self.instr.read_bytes(int(header[1:])))
+
+    def query_batch(self, queries):
+        """Send multiple queries as a single compound command and return the list of responses.
+
+        :param queries: List of complete queries, e.g. ``["sense:freq:center?", "sense:freq:span?"]``.
+        """
+        cmd = _compound_command(queries)
+        responses = self.instr.query(cmd).strip().split(";")
+        if len(responses) != len(queries):
+            raise RuntimeError(f"Expected {len(queries)} responses to '{cmd}', got {len(responses)}: {responses}")
+        return responses
+
+    def write_properties(self, **values):
+        """Set several device parameters at once, sending consecutive VISA properties as a single compound command.
+
+        Example::
+
+            esa.write_properties(center_frequency=1e9, span=1e6, rbw=1e3)
+
+        Other properties can be set along with them, these are set one by one, in order. If :attr:`BATCH_WRITES` is
+        False, the VISA properties are written one by one as well.
+
+        :param values: Property names and the values to write to them.
+        """
+        visa_props = self._visa_properties()
+        for n in values:
+            if n in visa_props:
+                if visa_props[n].read_only:
+                    raise ValueError(f"'{n}' is read-only")
+            elif not isinstance(self.look_up_command_object(n), property):
+                # e.g. a visa_command, setting that would just replace the method
+                raise ValueError(f"'{n}' is not a property")
+
+        # run every distinct access guard only once
+        for guard in dict.fromkeys(visa_props[n].access_guard for n in values
+                                   if n in visa_props and visa_props[n].access_guard is not None):
+            guard(self)
+
+        # (command, whether the device responds to it)
+        cmds = []
+        for n, value in values.items():
+            p = visa_props.get(n)
+            if p is not None:
+                cmds.append((p.build_write_command(self, value, check_access=False), p.read_on_write))
+            else:
+                self._send_property_writes(cmds)
+                cmds = []
+                setattr(self, n, value)
+        self._send_property_writes(cmds)
+
+    def _send_property_writes(self, cmds):
+        if not cmds:
+            return
+        if not self.BATCH_WRITES:
+            for cmd, read_on_write in cmds:
+                self.instr.query(cmd) if read_on_write else self.instr.write(cmd)
+        elif any(read_on_write for _, read_on_write in cmds):
+            # these devices respond to a setting, so expect a (compound) response and discard it
+            self.instr.query(_compound_command([cmd for cmd, _ in cmds]))
+        else:
+            self.instr.write(_compound_command([cmd for cmd, _ in cmds]))
+
+    def read_properties(self, names, wait_for=None) -> dict:
+        """Read out several VISA properties with a single compound query.
+
+        :param names: Names of the properties to read, these should be defined with :func:`visa_property`.
+        :param wait_for: Optional command to chain after the queries, e.g. to start an acquisition. The values are then
+            only returned once this command has finished (see :meth:`wait_until_done`), which saves a separate
+            exchange with the device.
+        :return: dict of property names and values
+        """
+        visa_props = self._visa_properties()
+        for n in names:
+            if n not in visa_props:
+                raise ValueError(f"'{n}' is not a VISA property")
+        props = {n: visa_props[n] for n in names}
+
+        queries = {n: p.build_query(self) for n, p in props.items()}
+        cache = self.property_cache
+        values = {n: cache[q] for n, q in queries.items() if (props[n].cache or cache.scope_depth) and q in cache}
+        to_read = [n for n in names if n not in values]
+
+        if to_read:
+            # run every distinct access guard only once
+            for guard in dict.fromkeys(props[n].access_guard for n in to_read if props[n].access_guard is not None):
+                guard(self)
+
+            if wait_for is not None and not self.WAIT_WITH_SRQ:
+                # the response to *OPC? comes after the property values, and only once the command has finished
+                cmd = _compound_command([queries[n] for n in to_read] + [wait_for])
+                responses = self.wait_until_done(cmd).strip().split(";")
+                if len(responses) != len(to_read) + 1:
+                    raise RuntimeError(f"Expected {len(to_read) + 1} responses to '{cmd};*OPC?', got {len(responses)}: {responses}")
+                wait_for = None
+            else:
+                responses = self.query_batch([queries[n] for n in to_read])
+            for n, r in zip(to_read, responses):
+                values[n] = props[n].parse_response(self, r)
+                if props[n].cache or cache.scope_depth:
+                    cache.store(queries[n], values[n], props[n].cache)
+
+        if wait_for is not None:
+            self.wait_until_done(wait_for)
+
+        return {n: values[n] for n in names}
+
+    def invalidate_cache(self):
+        """Forget the stored values of all properties defined with ``cache=True``, such that they are queried from
+        the device again on their next read."""
+        self.property_cache.clear()
+        self.property_cache.scoped_keys.clear()
+
+    @contextlib.contextmanager
+    def cache_scope(self):
+        """Context manager within which all property reads are cached, not only those defined with ``cache=True``.
+
+        Useful for high-level functions that would otherwise read the same settings several times. Writes through
+        pylabframe still invalidate the cached values. Values cached only because of the scope are forgotten when the
+        (outermost) scope is left.
+        """
+        cache = self.property_cache
+        cache.scope_depth += 1
+        try:
+            yield self
+        finally:
+            cache.scope_depth -= 1
+            if not cache.scope_depth:
+                cache.end_scope()
+
+    def _read_metadata_values(self) -> dict:
+        visa_props = self._visa_properties()
+        if not self.BATCH_METADATA_QUERIES:
+            # visa properties are data descriptors, so nothing on the instance can shadow them: we call them directly
+            # rather than having getattr look them up again for every field
+            return {k: visa_props[attr].__get__(self) if attr in visa_props else getattr(self, attr)
+                    for k, attr in self.metadata_registry.items()}
+
+        batch_names = self._metadata_visa_properties()
+        batch_values = self.read_properties(batch_names) if batch_names else {}
+
+        return {k: batch_values[attr] if attr in batch_values else getattr(self, attr) for k, attr in self.metadata_registry.items()}
+
+    def _metadata_visa_properties(self) -> list:
+        # names of the metadata fields that are VISA properties, i.e. the ones that can be read out in one go
+        visa_props = self._visa_properties()
+        return [attr for attr in dict.fromkeys(self.metadata_registry.values()) if attr in visa_props]
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def _visa_properties(cls) -> dict:
+        # all VISA properties of this device class by name. like _all_metadata_fields, this only depends on the class,
+        # so it's worked out once rather than every time a set of properties is read out.
+        # process bottom to top, such that a subclass can override (or remove) a property
+        visa_props = {}
+        for subcl in cls.__mro__[::-1]:
+            for n, v in vars(subcl).items():
+                if isinstance(v, VisaProperty):
+                    visa_props[n] = v
+                else:
+                    visa_props.pop(n, None)
+        return visa_props
 
     def look_up_command_object(self, cmd):
         if isinstance(cmd, str):
-            if not hasattr(type(self), cmd):
-                raise ValueError(f"Visa command '{cmd}' cannot be found.")
-            cmd = getattr(type(self), cmd)
+            # visa properties are looked up in the per-class registry, which is a single dict access
+            prop = self._visa_properties().get(cmd)
+            if prop is not None:
+                return prop
+            name = cmd
+            cmd = getattr(type(self), name, None)
+            if cmd is None:
+                raise ValueError(f"Visa command '{name}' cannot be found.")
         if not isinstance(cmd, property) and not callable(cmd):
             raise ValueError(f"Invalid command object '{cmd}'. Hint: don't supply <device>.<command> (e.g. my_laser.wavelength), which references the value of the property, not the command object itself. Supply either 'type(<device>).<command>' (e.g. type(my_laser).wavelength) or the name of the command (e.g. 'wavelength')")
 
@@ -340,6 +878,8 @@ class VisaDevice(device.Device):
 
         for k,v in kw.items():
             self.command_options[cmd][k] = v
+        # cached values have the old options applied
+        self.invalidate_cache()
 
     def remove_command_option(self, cmd, value_multiplier=False, **kw):
         cmd = self.look_up_command_object(cmd)
@@ -352,6 +892,7 @@ class VisaDevice(device.Device):
         for k,v in kw.items():
             if v and k in self.command_options[cmd]:
                 del self.command_options[cmd][k]
+        self.invalidate_cache()
 
     ## standard SCPI commands
     clear_status = visa_command("*CLS")
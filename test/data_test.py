@@ -1,11 +1,10 @@
 import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
 
 
 import pylabframe as lab
 import pylabframe.data
+from pylabframe.data import fitters
+from pylabframe.hw.drivers import tekvisa
 
 test = lab.data.NumericalData(
     np.linspace(0,20,51), [20.0,30.0,40.0],
@@ -42,9 +41,61 @@ restack.metadata['settings444'] = {'eggd': 5, 'cool': {
 restack.save_npz("test/restack.npz")
 restack_loaded = lab.data.NumericalData.load_npz('test/restack.npz')
 
+
+# save/load round trips must give back the metadata exactly, including values that JSON can't express (arrays, tuples,
+# non-string keys). those files fall back to pickled metadata
+def assert_same(a, b):
+    assert type(a) is type(b), (a, b)
+    if isinstance(a, dict):
+        assert list(a.keys()) == list(b.keys()), (a, b)
+        for k in a:
+            assert_same(a[k], b[k])
+    elif isinstance(a, (list, tuple)):
+        assert len(a) == len(b), (a, b)
+        for ai, bi in zip(a, b):
+            assert_same(ai, bi)
+    elif isinstance(a, np.ndarray):
+        assert np.array_equal(a, b), (a, b)
+    else:
+        assert a == b, (a, b)
+
+
+def assert_round_trip(data_obj, file):
+    data_obj.save_npz(file, save_location_option="cwd", exist_ok=True)
+    loaded = NumericalData.load_npz(file)
+    assert np.array_equal(loaded.data_array, data_obj.data_array)
+    for ax, loaded_ax in zip(data_obj.axes, loaded.axes):
+        assert np.array_equal(ax, loaded_ax)
+    assert_same(loaded.axes_names, data_obj.axes_names)
+    assert_same(loaded.reduced_axes, data_obj.reduced_axes)
+    assert_same(loaded.metadata, data_obj.metadata)
+
+
+json_md = NumericalData(np.arange(5.), x_axis=np.linspace(0, 1, 5), metadata={'a': 1.5, 'b': 'volt', 'c': [1, 2], 'd': {'e': None}})
+assert_round_trip(json_md, "test/round_trip_json.npz")
+
+odd_md = NumericalData(np.arange(5.), x_axis=np.linspace(0, 1, 5), metadata={'arr': np.arange(3), 'tup': (1, 2), 'keys': {0: 'a', 1: 'b'}})
+assert_round_trip(odd_md, "test/round_trip_odd.npz")
+
+stacked = NumericalData.stack([json_md, odd_md], new_axis=[10., 20.], new_axis_name="run", retain_individual_metadata=True)
+assert_round_trip(stacked, "test/round_trip_stacked.npz")
+assert list(NumericalData.load_npz("test/round_trip_stacked.npz").metadata["_individual_metadata"].keys()) == [0, 1]
+assert_round_trip(stacked.iloc[:, 1], "test/round_trip_reduced.npz")
+
+# object arrays are pickled by numpy, these files have to load as well
+object_data = NumericalData(np.array([{'a': 1}, None, "x"], dtype=object), x_axis=np.arange(3.), metadata={'a': 1.5})
+assert_round_trip(object_data, "test/round_trip_object.npz")
+object_axis = NumericalData(np.arange(3.), x_axis=np.array(["a", 1, None], dtype=object))
+assert_round_trip(object_axis, "test/round_trip_object_axis.npz")
+
 fit_x = np.linspace(-10,10)
 lor_data = fitters.Lorentzian.func(fit_x, 2., 0.5, 1.3, 0.9) + np.random.normal(0, 0.05, fit_x.shape)
 
+# only pull in matplotlib (and the Tk backend) once we actually plot
+import matplotlib
+matplotlib.use('TkAgg')
+import matplotlib.pyplot as plt
+
 plt.figure()
 lor_obj = NumericalData(lor_data, x_axis=fit_x)
 lor_obj.plot()
@@ -54,3 +105,44 @@ fr = lor_obj.fit(fitters.Lorentzian)
 import scipy.optimize
 aa = scipy.optimize.curve_fit(fitters.Lorentzian.func, lor_obj.x_axis, lor_obj.data_array, p0=None, full_output=True)
 
+
+
+# find_path: exact matching of path segments
+import os
+import tempfile
+from pylabframe.data import path
+
+find_root = tempfile.mkdtemp()
+for d in ["run1", "run10", "run2_extra"]:
+    os.makedirs(os.path.join(find_root, "2024-01-01 sample", d))
+open(os.path.join(find_root, "2024-01-01 sample", "run1", "trace.npz"), "w").close()
+
+# as a prefix, 'run1' is ambiguous. with exact=True it's a literal name
+try:
+    path.find_path("2024-01-01", "run1", parent_dir=find_root)
+    raise AssertionError("ambiguous prefix should raise")
+except RuntimeError as e:
+    assert "run10" in str(e)
+assert path.find_path("2024-01-01 sample", "run1", parent_dir=find_root, exact=True) == os.path.join(find_root, "2024-01-01 sample", "run1")
+try:
+    path.find_path("2024-01-01", "run1", parent_dir=find_root, exact=True)
+    raise AssertionError("exact=True shouldn't match on a prefix")
+except FileNotFoundError:
+    pass
+# wildcards still work in exact mode
+assert path.find_path("2024-01-01 sample", "run2*", parent_dir=find_root, exact=True) == os.path.join(find_root, "2024-01-01 sample", "run2_extra")
+
+# find_path: sharing directory listings between calls
+dir_cache = {}
+assert path.find_path("2024", "run2", parent_dir=find_root, dir_cache=dir_cache) == os.path.join(find_root, "2024-01-01 sample", "run2_extra")
+assert path.find_path("2024", "run10", parent_dir=find_root, dir_cache=dir_cache) == os.path.join(find_root, "2024-01-01 sample", "run10")
+assert set(dir_cache) == {find_root, os.path.join(find_root, "2024-01-01 sample")}
+# the listings aren't refreshed: a new entry is only seen without the cache
+os.makedirs(os.path.join(find_root, "2024-01-01 sample", "run3"))
+try:
+    path.find_path("2024", "run3", parent_dir=find_root, dir_cache=dir_cache)
+    raise AssertionError("cached listing shouldn't contain run3")
+except FileNotFoundError:
+    pass
+assert path.find_path("2024", "run3", parent_dir=find_root) == os.path.join(find_root, "2024-01-01 sample", "run3")
+assert path.find_path("2024", "run3", parent_dir=find_root, dir_cache={}) == os.path.join(find_root, "2024-01-01 sample", "run3")
@@ -15,3 +15,72 @@ data_tr.plot(ls='none')
 
 data_fit = data_tr.fit(lab.data.fitters.Line, pfix_dict={"a": 0.5})
 data_fit.plot()
+
+
+# batch fitting gives the same parameters as fitting the traces one by one
+from pylabframe.data import fitters, NumericalData
+
+rng = np.random.default_rng(1)
+batch_x = np.linspace(-10, 10, 201)
+batch_y = np.array([
+    fitters.Lorentzian.fit_func(batch_x, area, 1., center, 0.1) + rng.normal(0, 0.01, len(batch_x))
+    for area, center in [(2., -1.), (3., 0.5), (1.5, 2.)]
+])
+
+batch_fits = fitters.Lorentzian.fit_batch(batch_x, batch_y)
+assert len(batch_fits) == len(batch_y)
+for y_i, batch_fit in zip(batch_y, batch_fits):
+    single_fit = NumericalData(y_i, x_axis=batch_x).fit(fitters.Lorentzian)
+    for pn in fitters.Lorentzian.param_names:
+        assert np.isclose(batch_fit.popt_dict[pn], single_fit.popt_dict[pn], rtol=1e-4, atol=1e-6), (pn, batch_fit.popt_dict, single_fit.popt_dict)
+        assert np.isclose(batch_fit.perr_dict[pn], single_fit.perr_dict[pn], rtol=1e-2), (pn, batch_fit.perr_dict, single_fit.perr_dict)
+
+# fixed parameters are left out of the fit, for all traces
+batch_fits_fixed = fitters.Lorentzian.fit_batch(batch_x, batch_y, pfix_dict={"linewidth": 1.})
+assert all("linewidth" not in f.popt_dict for f in batch_fits_fixed)
+
+# a fixed parameter stays a scalar while the free ones are evaluated per trace, which has to broadcast
+for fitter in [fitters.Lorentzian, fitters.Gaussian]:
+    centered_y = np.array([fitter.fit_func(batch_x, a, 1., 0., 0.1) + rng.normal(0, 0.01, len(batch_x)) for a in [1., 2., 3.]])
+    centered_fits = fitter.fit_batch(batch_x, centered_y, pfix_dict={"center": 0.})
+    for y_i, batch_fit in zip(centered_y, centered_fits):
+        single_fit = NumericalData(y_i, x_axis=batch_x).fit(fitter, pfix_dict={"center": 0.})
+        for pn, val in single_fit.popt_dict.items():
+            assert np.isclose(batch_fit.popt_dict[pn], val, rtol=1e-4, atol=1e-6), (fitter, pn, batch_fit.popt_dict, single_fit.popt_dict)
+
+
+# peak guesses on the same data reuse the smoothed trace, until data_array is reassigned
+smooth_data = NumericalData(batch_y[0].copy(), x_axis=batch_x)
+first_guess = fitters.Lorentzian.guess_func(data=smooth_data, smoothing_window=11, smoothing_order=2)
+smooth_data.data_array = batch_y[1].copy()
+second_guess = fitters.Lorentzian.guess_func(data=smooth_data, smoothing_window=11, smoothing_order=2)
+assert second_guess == fitters.Lorentzian.guess_func(x=batch_x, y=batch_y[1], smoothing_window=11, smoothing_order=2)
+assert second_guess != first_guess
+smooth_data.data_array *= 2
+assert fitters.Lorentzian.guess_func(data=smooth_data, smoothing_window=11, smoothing_order=2)["area"] == 2 * second_guess["area"]
+# postprocessing is allowed to work in-place
+inplace_guess = fitters.Lorentzian.guess_func(data=smooth_data, smoothing_window=11, smoothing_order=2,
+                                              smooth_postprocess=lambda a: np.multiply(a, 0.5, out=a))
+assert np.isclose(inplace_guess["offset"], second_guess["offset"])
+
+
+# the streaming Savitzky-Golay filter matches scipy's, lagging by half a window
+import scipy.signal
+
+stream_y = rng.normal(0, 1, 500)
+for window, order in [(11, 2), (21, 3)]:
+    reference = scipy.signal.savgol_filter(stream_y, window, order)
+    half = window // 2
+
+    one_by_one = fitters.StreamingSavgol(window, order)
+    streamed = np.array([one_by_one.process_one(s) for s in stream_y])
+    assert np.all(np.isnan(streamed[:window - 1]))
+    assert np.allclose(streamed[window - 1:], reference[half:len(stream_y) - half])
+
+    # processing in blocks of any size gives the same output, also across the point where the window fills up
+    in_blocks = fitters.StreamingSavgol(window, order)
+    blocked = np.concatenate([in_blocks.process(b) for b in np.split(stream_y, [3, 7, 50, 51, 300])])
+    assert np.allclose(blocked, streamed, equal_nan=True)
+
+    in_blocks.reset()
+    assert np.allclose(in_blocks.process(stream_y), streamed, equal_nan=True)
@@ -0,0 +1,131 @@
+from pylabframe.hw import visadevice
+from pylabframe.hw.visadevice import visa_property
+
+
+# a stand-in for a pyvisa resource: keeps the device settings in a dict and answers (compound) SCPI queries
+class FakeInstr:
+    def __init__(self):
+        self.settings = {"freq": "1.5", "pow": "-10", "mode": "SA"}
+        self.log = []
+        self.drop_responses = 0
+        self.timeout = 2000
+
+    def _handle(self, cmd):
+        cmd = cmd.lstrip(":")
+        if cmd == "*OPC?":
+            return "1"
+        if cmd.endswith("?"):
+            return self.settings[cmd[:-1]]
+        if " " in cmd:
+            name, value = cmd.split(" ", 1)
+            self.settings[name] = value
+        # commands without a value (e.g. starting an acquisition) have no effect here
+        return None
+
+    def query(self, cmd):
+        self.log.append(("query", cmd))
+        responses = [r for r in (self._handle(c) for c in cmd.split(";")) if r is not None]
+        # simulates a device that doesn't answer all parts of a compound query
+        responses = responses[:len(responses) - self.drop_responses]
+        return ";".join(responses) + "\n"
+
+    def write(self, cmd):
+        self.log.append(("write", cmd))
+        self.pending = self.query(cmd)
+        self.log.pop()
+
+    def read(self):
+        return self.pending
+
+    def close(self):
+        pass
+
+
+class FakeResourceManager:
+    def open_resource(self, address, **kw):
+        return FakeInstr()
+
+
+visadevice._visa_rm = FakeResourceManager()
+
+
+class FakeDevice(visadevice.VisaDevice):
+    frequency = visa_property("freq", rw_conv=float)
+    power = visa_property("pow", rw_conv=float)
+    mode = visa_property("mode", cache=True)
+
+
+dev = FakeDevice("fake", "FAKE::INSTR", error_on_double_connect=False)
+
+# query_batch splits the compound response, one entry per query
+assert dev.query_batch(["freq?", "pow?", "mode?"]) == ["1.5", "-10", "SA"]
+assert dev.instr.log[-1] == ("query", ":freq?;:pow?;:mode?")
+
+# a response count that doesn't match the queries raises, rather than returning shifted values
+dev.instr.drop_responses = 1
+try:
+    dev.query_batch(["freq?", "pow?"])
+    raise AssertionError("missing response should raise")
+except RuntimeError as e:
+    assert "Expected 2 responses" in str(e)
+dev.instr.drop_responses = 0
+
+# read_properties converts every value like a normal property read, with a single query
+dev.instr.log.clear()
+assert dev.read_properties(["frequency", "power", "mode"]) == {"frequency": 1.5, "power": -10.0, "mode": "SA"}
+assert len(dev.instr.log) == 1
+# cached properties are not queried again
+dev.instr.log.clear()
+assert dev.read_properties(["mode", "power"]) == {"mode": "SA", "power": -10.0}
+assert dev.instr.log == [("query", ":pow?")]
+try:
+    dev.read_properties(["frequency", "nope"])
+    raise AssertionError("unknown property should raise")
+except ValueError:
+    pass
+
+# with wait_for, the values come in after the command finishes, in the same exchange
+dev.instr.log.clear()
+assert dev.read_properties(["frequency"], wait_for="init") == {"frequency": 1.5}
+assert dev.instr.log == [("write", ":freq?;:init;*OPC?")]
+
+# write_properties sets consecutive VISA properties with a single compound command
+dev.instr.log.clear()
+dev.write_properties(frequency=2.5, power=-3.0)
+assert dev.instr.log == [("write", ":freq 2.5;:pow -3.0")]
+assert dev.read_properties(["frequency", "power"]) == {"frequency": 2.5, "power": -3.0}
+
+# writing drops the cached value
+dev.write_properties(mode="IQ")
+assert dev.mode == "IQ"
+
+
+# other properties are set in order, between the batches
+class FakeDeviceWithExtra(FakeDevice):
+    @property
+    def extra(self):
+        return None
+
+    @extra.setter
+    def extra(self, value):
+        self.instr.log.append(("extra", value))
+
+    do_something = visadevice.visa_command("something")
+
+
+dev2 = FakeDeviceWithExtra("fake2", "FAKE::INSTR", error_on_double_connect=False)
+dev2.write_properties(frequency=1.0, extra=5, power=2.0)
+assert dev2.instr.log == [("write", ":freq 1.0"), ("extra", 5), ("write", ":pow 2.0")]
+
+# without compound commands, every property is written separately
+dev2.instr.log.clear()
+dev2.BATCH_WRITES = False
+dev2.write_properties(frequency=3.0, power=4.0)
+assert dev2.instr.log == [("write", "freq 3.0"), ("write", "pow 4.0")]
+
+for bad_values in [dict(nope=1), dict(do_something=1)]:
+    try:
+        dev2.write_properties(**bad_values)
+        raise AssertionError(f"{bad_values} should raise")
+    except ValueError:
+        pass